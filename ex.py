@@ -2,7 +2,7 @@
 # Experimentation
 
 #from ws2812 import WS2812
-from lights import Lights
+from lights import Lights, FrameScheduler
 from percolator import Percolator
 from ringramp import RingRamp, Ball
 from jewel7 import Jewel7
@@ -46,11 +46,14 @@ class Lightshow:
 
         self.percolator = \
                 Percolator(WS2812(spi_bus=config['leds'].get('spi'),
-                                  led_count=config['leds'].get('qty')))
+                                  led_count=config['leds'].get('qty')),
+                           batched=True)
         self.percolator.bingo = self.bingo
 
         self.ws_rings = WS2812(2, 2*7 + 45)
-        self.ring_lights = Lights(self.ws_rings)
+        # The feed rollers and the ramp share one frame on the rings
+        self.ring_frames = FrameScheduler(self.ws_rings, fps=50)
+        self.ring_lights = Lights(self.ws_rings, scheduler=self.ring_frames)
 
         self.feed_rollers = [Jewel7(lights=self.ring_lights[0:7]),
                              Jewel7(lights=self.ring_lights[7:14])]
@@ -220,8 +223,8 @@ class Lightshow:
             #then = time()
             lower.gear.cw()
             upper.gear.ccw()
-            lower.render()
-            upper.render()
+            lower.update()
+            upper.update()
             #now = time()
             #t = 20 - (now - then)
             #then = now
@@ -235,8 +238,11 @@ class Lightshow:
         while True:
             v = a.read()
             amb = 0.95*amb + 0.05*v/4096
-            bv = 254*amb + 1
-            self.set_brightness(bv)
+            # Whole steps only, as a change of brightness renders
+            # everything again
+            bv = round(254*amb + 1)
+            if bv != self.brightness:
+                self.set_brightness(bv)
             yield from sleep(123)
 
     @coroutine
@@ -253,6 +259,8 @@ class Lightshow:
         self.loop = yield GetRunningLoop(None)
         yield self.manage_brightness()
         yield self.percolator.keep_leds_current(10)
+        yield self.percolator.run()
+        yield self.ring_frames.run()
         for i in range(7, 63, 7):
             self.percolator.set_color_of(i, self.percolator.stoichiometric)
         yield self.percolator.bingo()
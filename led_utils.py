@@ -1,8 +1,16 @@
 # -*- coding: utf-8 -*-
 #import random
 import math
+from array import array
 #from async_pyb import coroutine, sleep, GetRunningLoop, Sleep
 #from pyb import Timer, rng, micros, elapsed_micros
+from sys import platform
+
+# The word movers that go with the WS2812 buffers
+if platform == 'pyboard':
+    from ws2812_helper_pyb import _fillwords, _movewords, _reverseblocks
+else:
+    from ws2812_helper_sim import _fillwords, _movewords, _reverseblocks
 
 
 def display_list_for(x, color, blur=1.0):
@@ -56,3 +64,58 @@ def gaussian_blur_weights(x, blur=1.0):
     return rv
 
 
+# Sub-pixel positions per pixel at which blur kernels are made
+kernel_steps = 16
+
+# Blur kernels by blur, each a list by sub-pixel step
+_kernels = {}
+
+def blur_kernel(x, blur=1.0):
+    # The weights of gaussian_blur_weights(x, blur), with x taken to
+    # the nearest 1/kernel_steps of a pixel, as (first, weights): the
+    # position of the first weight and an array of the weights in
+    # 16.16 fixed point. Made once for each blur and sub-pixel step,
+    # and shared, so not to be changed.
+    nearest_i = round(x)
+    if not blur:
+        return nearest_i, _unit_weights
+    steps = kernel_steps
+    q = round((x - nearest_i) * steps)   # -steps/2 to steps/2
+    kernels = _kernels.get(blur)
+    if kernels is None:
+        kernels = _kernels[blur] = [None] * (steps + 1)
+    kernel = kernels[q + steps//2]
+    if kernel is None:
+        wts = gaussian_blur_weights(q / steps, blur)
+        kernel = kernels[q + steps//2] = \
+            (wts[0][0], array('H', (min(round(w * 65536), 65535)
+                                    for i, w in wts)))
+    first, weights = kernel
+    return nearest_i + first, weights
+
+_unit_weights = array('H', (65535,))
+
+def splat(points, sources, blur=1.0, offset=0, wrap=None):
+    # Add each of sources, pairs of (x, (r, g, b)) with x in pixels,
+    # into points, blurred as display_list_for() would do it but with
+    # cached kernels and nothing made on the heap per pixel. Pixel i
+    # goes to points[(i + offset) % wrap] (points[i + offset] without
+    # wrap) if that is in range, and is dropped if not. points is any
+    # sequence of r,g,b lattice points, e.g. a Lights.
+    for x, color in sources:
+        r, g, b = color
+        splat_point(points, x, r, g, b, blur, offset, wrap)
+
+def splat_point(points, x, r, g, b, blur=1.0, offset=0, wrap=None):
+    # splat() for one source, with its color as r, g and b
+    n = len(points)
+    k, weights = blur_kernel(x, blur)
+    k += offset
+    for w in weights:
+        i = k % wrap if wrap else k
+        k += 1
+        if 0 <= i < n:
+            p = points[i]
+            p[0] += (r*w + 0x8000) >> 16
+            p[1] += (g*w + 0x8000) >> 16
+            p[2] += (b*w + 0x8000) >> 16
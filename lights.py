@@ -1,5 +1,45 @@
 # -*- coding: utf-8 -*-
 from async_pyb import coroutine, sleep, GetRunningLoop, Sleep
+from array import array
+from ws2812_encode import fill_transform_table
+
+
+def contiguous_lattice(n, typecode='B'):
+    # A lattice of n points kept in one buffer of 3*n values, rather
+    # than each in a bytearray of its own. Returns the buffer, a
+    # bytearray for typecode 'B' or else an array, and the lattice,
+    # a list of memoryviews of its points. Typecode 'h' makes the
+    # points signed, so colors can be added and subtracted past 0-255;
+    # they are clamped to 0-255 as they are rendered.
+    if typecode == 'B':
+        store = bytearray(3*n)
+    else:
+        store = array(typecode, (0 for i in range(3*n)))
+    mv = memoryview(store)
+    return store, [mv[3*i:3*i+3] for i in range(n)]
+
+
+def _to_led(p, table, types, br, gamma, buf):
+    # Lattice point p as the leds take it. Bytes (p one of types) are
+    # looked up in table, or are taken as they are if there is none.
+    # Anything else, such as floats or signed values, is worked out as
+    # the table was: raised to gamma, scaled by br/256, rounded and
+    # clamped to 0-255, in buf.
+    if isinstance(p, types):
+        if table is None:
+            return p
+        buf[0] = table[p[0]]
+        buf[1] = table[p[1]]
+        buf[2] = table[p[2]]
+        return buf
+    for k in range(3):
+        v = p[k]
+        if gamma != 1:
+            v = 255 * (v / 255) ** gamma if v > 0 else 0
+        v = (int(br*v) + 128) >> 8
+        buf[k] = 0 if v < 0 else 255 if v > 255 else v
+    return buf
+
 
 class Lights:
     # Lights encapsulated a WS2812, and provides a "lattice" model of
@@ -7,28 +47,116 @@ class Lights:
     # lattice model has a default treatment in the rendering, which
     # subclasses are free to override. They can then use their lattice
     # points in their own models however they please.
+    #
+    # By default each lattice point is a bytearray of its own. With a
+    # lattice_type ('B' or 'h', see contiguous_lattice()) they are all
+    # in one buffer, self.store, which clear() and render() then work
+    # on directly.
+    #
+    # Lattice points changed through the Lights (by __setitem__,
+    # add_color_to(), sub_color_from(), set_color_of() or clear()) are
+    # marked in self.dirty, and render() sends only those to the leds
+    # when the model is the lattice as it is. Code that writes lattice
+    # points directly calls mark_dirty() after, or sets incremental
+    # False to have every render() send them all. Anything else that
+    # writes the leds, another Lights or not, is seen by the count of
+    # writes the leds keep (see WS2812.writes), and has the whole
+    # lattice rendered again.
+
+    incremental = True
     def __init__(self, leds=None, lights=None, timer=None, lattice=None, indexed_range=None,
-                 *args, **kwargs):
+                 scheduler=None, lattice_type=None, *args, **kwargs):
+        store = dirty = seen = None
         if isinstance(lights, Lights):
             leds = leds or lights.leds
             timer = timer or lights.timer
             lattice = lattice or lights.lattice
             indexed_range = indexed_range or lights.indexed_range
+            scheduler = scheduler or lights.scheduler
+            if lattice is lights.lattice:
+                store = lights.store
+                dirty = lights.dirty
+                seen = lights._seen
         self.leds = leds
         self.timer = timer
+        self.scheduler = scheduler
         if leds is None:
             pass                # FIXME
+        if lattice is None and lattice_type is not None:
+            store, lattice = contiguous_lattice(len(leds), lattice_type)
+        self.store = store
         self.lattice = lattice or [bytearray(3) for i in range(len(leds))]
+        if dirty is None:
+            # One flag per lattice point, shared by all the Lights on
+            # the lattice. Everything starts out needing a render.
+            dirty = bytearray(b'\1' * len(self.lattice))
+        self.dirty = dirty
+        # The leds' count of writes after the last render of the
+        # lattice, shared likewise
+        self._seen = seen or [None]
+        # The points that hold bytes, which brightness is applied to by
+        # table
+        if isinstance(store, bytearray):
+            self._bytes_types = (bytearray, bytes, memoryview)
+        else:
+            self._bytes_types = (bytearray, bytes)
+        self._table = None
+        self._tables = 0
+        self._flat = None
+        # The table, and the leds' intensity and gamma, at the last
+        # render, as a change of any means rendering everything again
+        self._rendered_table = None
+        self._rendered_at = None
+        self._rendered_gamma = None
         if indexed_range is None:
             indexed_range = range(len(leds))
         self.indexed_range = indexed_range
         self.leds_sync_last_done = 0
         self.leds_need_sync = False
-        self.brightness = 1.0
+        self._brightness = 1.0
+        self._br = 256
+        self._gamma = 1
 
     def __len__(self):
         return len(self.indexed_range)
 
+    @property
+    def brightness(self):
+        return self._brightness
+
+    @brightness.setter
+    def brightness(self, v):
+        # Brightness scales the colors of this Lights as they render.
+        # Bytes are scaled by a table, rebuilt only here.
+        if v == self._brightness:
+            return
+        self._brightness = v
+        self._br = round(v * 256)
+        self._retable()
+
+    def _retable(self):
+        # One table of what each byte value becomes, for brightness and
+        # gamma together
+        if self._br == 256 and self._gamma == 1:
+            self._table = None
+        else:
+            self._table = fill_transform_table(self._table or bytearray(256),
+                                               self._brightness, self._gamma)
+        self._tables += 1
+
+    @property
+    def gamma(self):
+        return self._gamma
+
+    @gamma.setter
+    def gamma(self, v):
+        # Gamma is applied through the same table as brightness, before
+        # it, and likewise only for this Lights
+        if v == self._gamma:
+            return
+        self._gamma = v
+        self._retable()
+
     def __getitem__(self, ix):
         # Indexing with an integer gets you the underlying lattice point
         # Indexing with a slice gets you a new Lights with the derivative indexed_range
@@ -44,30 +172,70 @@ class Lights:
         else:
             i_val = zip(self.indexed_range[ix], val)
 
+        dirty = self.dirty
         for i, val in i_val:
+            dirty[i] = 1
             p = self.lattice[i]
             try: # to reuse storage
                 for k,v in enumerate(val):
                     p[k] = v
             except (TypeError, IndexError):
+                if self.store is not None:
+                    # A point in the store holds 3 values, and only those
+                    raise
                 self.lattice[i] = val
 
+    def _span(self):
+        # (start, stop) of the lattice points in the store, if this
+        # Lights is a contiguous run of them, else None
+        if self.store is None:
+            return None
+        r = self.indexed_range
+        try:
+            if r.step != 1:
+                return None
+            return r.start, r.stop
+        except AttributeError:
+            return None
+
+    def mark_dirty(self, ix=None):
+        # Mark point ix, or all the points, of this Lights as changed
+        dirty = self.dirty
+        if ix is None:
+            for i in self.indexed_range:
+                dirty[i] = 1
+        else:
+            dirty[self.indexed_range[ix]] = 1
+
     def clear(self):
+        self.mark_dirty()
+        span = self._span()
+        if span is not None:
+            store = self.store
+            for k in range(3*span[0], 3*span[1]):
+                store[k] = 0
+            return
         for p in self:
             p[0] = p[1] = p[2] = 0
 
     def add_color_to(self, i, color):
-        p = self[i]
+        i = self.indexed_range[i]
+        self.dirty[i] = 1
+        p = self.lattice[i]
         for i in range(3):
             p[i] += color[i]
 
     def sub_color_from(self, i, color):
-        p = self[i]
+        i = self.indexed_range[i]
+        self.dirty[i] = 1
+        p = self.lattice[i]
         for i in range(3):
             p[i] -= color[i]
 
     def set_color_of(self, i, color):
-        p = self[i]
+        i = self.indexed_range[i]
+        self.dirty[i] = 1
+        p = self.lattice[i]
         for i in range(3):
             p[i] = color[i]
 
@@ -76,37 +244,96 @@ class Lights:
         for i in self.indexed_range:
             yield lattice[i]
 
+    _led_buf = bytearray(3)     # Reused, to keep garbage off the heap
     def gen_RGBs(self):
-        br = round(self.brightness * 256)
-        #buf = [0, 0, 0] # 18.86ms
-        buf = bytearray(range(3)) # 16.93ms
+        # The model colors with brightness and gamma applied, as
+        # integers in 0-255
+        table = self._table
+        types = self._bytes_types
+        br = self._br
+        gamma = self._gamma
+        buf = bytearray(3)
         for p in self.model_colors():
-            # The pythonic way is too expensive:
-            #yield (min(int((br*v + 128) / 256), 255) for v in p) # 33.45ms
-            #yield list(min(int((br*v + 128) / 256), 255) for v in p) # 22.83ms
-            r, g, b = p
-
-            # 13.4546ms
-            #buf[0] = min(int((br*r + 128) / 256), 255)
-            #buf[1] = min(int((br*g + 128) / 256), 255)
-            #buf[2] = min(int((br*b + 128) / 256), 255)
-
-            # 12.3317ms
-            #buf[0] = min((int(br*r) + 128) // 256, 255)
-            #buf[1] = min((int(br*g) + 128) // 256, 255)
-            #buf[2] = min((int(br*b) + 128) // 256, 255)
-
-            # 12.2485ms
-            buf[0] = min((int(br*r) + 128) >> 8, 255)
-            buf[1] = min((int(br*g) + 128) >> 8, 255)
-            buf[2] = min((int(br*b) + 128) >> 8, 255)
-            yield buf
+            yield _to_led(p, table, types, br, gamma, buf)
+
+    def _renders_lattice(self):
+        # Whether the colors rendered are the lattice points as they are
+        cls = self.__class__
+        return cls.gen_RGBs is Lights.gen_RGBs \
+            and cls.model_colors is Lights.model_colors
 
     def render(self):
         leds = self.leds
+        seen = self._seen
+        if getattr(leds, 'writes', None) != seen[0]:
+            # The leds were written by something else since the lattice
+            # was last rendered, so all of it may be stale
+            dirty = self.dirty
+            for i in range(len(dirty)):
+                dirty[i] = 1
+        self._render()
+        seen[0] = getattr(leds, 'writes', None)
+
+    def _render(self):
+        leds = self.leds
+        lattice = self.lattice
+        dirty = self.dirty
+        plain = self._renders_lattice()
+        table = self._table
+        intensity = getattr(leds, 'intensity', None)
+        gamma = getattr(leds, 'gamma', None)
+        if plain and self.incremental and self._tables == self._rendered_table \
+           and intensity == self._rendered_at and gamma == self._rendered_gamma:
+            # Only the points changed since they were last rendered
+            types = self._bytes_types
+            br = self._br
+            gamma = self._gamma
+            buf = self._led_buf
+            for i in self.indexed_range:
+                if dirty[i]:
+                    leds[i] = _to_led(lattice[i], table, types, br, gamma, buf)
+                    dirty[i] = 0
+            return
+        self._rendered_table = self._tables
+        self._rendered_at = intensity
+        self._rendered_gamma = gamma
+        for i in self.indexed_range:
+            dirty[i] = 0
+        store = self.store
+        if plain and isinstance(store, bytearray):
+            span = self._span()
+            if span is not None and span[0] < span[1]:
+                # The model is the store: set the leds from it as flat
+                # r,g,b data, in one go, through the table if any
+                start, stop = span
+                i, j = 3*start, 3*stop
+                if table is not None:
+                    flat = self._flat
+                    if flat is None or len(flat) < j - i:
+                        flat = self._flat = bytearray(j - i)
+                    for k in range(i, j):
+                        flat[k - i] = table[store[k]]
+                    if len(flat) == j - i:
+                        leds[start:stop] = flat
+                    else:
+                        leds[start:stop] = memoryview(flat)[:j - i]
+                elif i == 0 and j == len(store):
+                    leds[start:stop] = store
+                else:
+                    leds[start:stop] = memoryview(store)[i:j]
+                return
         for i, c in zip(self.indexed_range, self.gen_RGBs()):
             leds[i] = c
 
+    def update(self):
+        # Show the model on the leds: at the next frame of the
+        # scheduler if there is one, else right now
+        if self.scheduler is not None:
+            self.scheduler.request(self)
+        else:
+            self.render()
+            self.leds.sync()
+
     @coroutine
     def show_for(self, duration):
         self.leds_need_sync = True
@@ -147,3 +374,113 @@ class Lights:
         return "<{} {} with {}>"\
             .format(self.__class__.__name__, self.leds, self.indexed_range)
 
+
+class FrameScheduler:
+    # Renders and syncs all the Lights on one strip together, at most
+    # once a frame, at up to fps frames a second. A Lights asks for a
+    # frame with request() (see Lights.update()), and however many
+    # requests come in between frames, each Lights is rendered once and
+    # the strip synced once. Lights that just set leds_need_sync, as
+    # keep_leds_current() expects, can be watch()ed instead.
+    #
+    # A frame started after the deadline of the one following it is
+    # missed, and the frames passed over are dropped rather than
+    # caught up. When a frame takes longer to render and sync than the
+    # time between frames, the scheduler goes to every stride-th
+    # frame, up to max_stride, and back down once it keeps up easily.
+    #
+    # Example:
+    #    frames = FrameScheduler(ws, fps=50)
+    #    lights = Lights(ws, scheduler=frames)
+    #    ...
+    #    yield frames.run()
+
+    easy_frames = 16        # Frames with time to spare before speeding up
+
+    def __init__(self, leds, fps=50, max_stride=8):
+        self.leds = leds
+        self.period = 1000 / fps    # ms, as loop.time()
+        self.max_stride = max_stride
+        self.stride = 1
+        self.pending = []
+        self.watched = []
+        self.frames = 0
+        self.missed = 0
+        self.dropped = 0
+        self.frame_ms = 0
+        self._easy = 0
+
+    def request(self, lights):
+        lights.leds_need_sync = True
+        if lights not in self.pending:
+            self.pending.append(lights)
+
+    def watch(self, lights):
+        if lights not in self.watched:
+            self.watched.append(lights)
+
+    def frame(self):
+        # Render each Lights waiting to be shown and sync the strip
+        # once. Returns whether there was anything to show.
+        pending = self.pending
+        for lights in self.watched:
+            if lights.leds_need_sync and lights not in pending:
+                pending.append(lights)
+        if not pending:
+            return False
+        for lights in pending:
+            lights.render()
+            lights.leds_need_sync = False
+        del pending[:]
+        self.leds.sync()
+        self.frames += 1
+        return True
+
+    def adapt(self, frame_ms):
+        # Choose the stride from how long a frame took
+        self.frame_ms = frame_ms
+        stride = self.stride
+        if frame_ms > stride * self.period:
+            if stride < self.max_stride:
+                self.stride = stride + 1
+            self._easy = 0
+        elif frame_ms < (stride - 1) * self.period / 2:
+            # Would fit in a shorter stride with half a frame to spare
+            self._easy += 1
+            if self._easy >= self.easy_frames:
+                self.stride = stride - 1
+                self._easy = 0
+        else:
+            self._easy = 0
+
+    def next_deadline(self, deadline, now):
+        # The deadline of the frame after the one due at deadline and
+        # started at now, passing over any that are already past
+        step = self.stride * self.period
+        late = now - deadline
+        if late >= step:
+            self.missed += 1
+            skip = int(late // step)
+            self.dropped += skip
+            deadline += skip * step
+        return deadline + step
+
+    @coroutine
+    def run(self):
+        loop = yield GetRunningLoop(None)
+        deadline = loop.time()
+        while True:
+            now = loop.time()
+            if now < deadline:
+                yield Sleep(deadline - now)
+                now = loop.time()
+            if self.frame():
+                self.adapt(loop.time() - now)
+            deadline = self.next_deadline(deadline, now)
+
+    def __repr__(self):
+        return "<FrameScheduler {} at 1/{} of {:.0f} fps, {} frames, " \
+            "{} missed, {} dropped>".format(self.leds, self.stride,
+                                           1000 / self.period, self.frames,
+                                           self.missed, self.dropped)
+
@@ -1,18 +1,37 @@
 import random
+from array import array
 from pyb import rng
-from async_pyb import coroutine, sleep
+from async_pyb import coroutine, sleep, GetRunningLoop, Sleep
 from lights import Lights
 
 
 class Percolator(Lights):
-    def __init__(self, leds):
+    # Particles of color fall from the top down through the lattice,
+    # one step every delay ms, reacting on the diagonal.
+    #
+    # By default each particle is a perk() coroutine of its own. With
+    # batched, they are rows of a particle table instead, all stepped
+    # by one run() coroutine, which renders once per tick however many
+    # moved. perk() then just launches a particle and waits for it.
+    def __init__(self, leds, lattice_type=None, batched=False):
         # Assume 8x8, and 0-based, for now
-        super().__init__(leds)
+        super().__init__(leds, lattice_type=lattice_type)
         self.top_i = len(leds) - 1
         self.bottom_i = 0
         self.random = random.SystemRandom()
         self.perk_quit = False
         self.stoichiometric = (1,1,1)
+        self.batched = batched
+        # The particle table: the lattice index each is at, its color,
+        # its delay and when it next moves (ms), and what to call with
+        # the color it leaves with (None if it doesn't) when it's gone
+        self.n = 0
+        self.at = array('h')
+        self.colors = bytearray()
+        self.delays = array('H')
+        self.due = array('i')
+        self.done = []
+        self.now = 0
 
     def down_left(self, i):
         # return the index into leds that is down-left of i
@@ -49,6 +68,12 @@ class Percolator(Lights):
     @coroutine
     def perk(self, delay, color, start=None):
         #print("perk(%d, %r, %r)" % (delay, color, start))
+        if self.batched:
+            box = []
+            self.launch(delay, color, start, box.append)
+            while not box:
+                yield from sleep(delay)
+            return box[0]
         stoichiometric = self.stoichiometric
         i = None
         while True:
@@ -102,7 +127,152 @@ class Percolator(Lights):
         while self.play_on:
             delay = random.randrange(30,100)
             color = random.choice(((8,0,0), (0,8,0), (0,0,8)))
-            yield self.perk(delay, color)
+            if self.batched:
+                self.launch(delay, color)
+            else:
+                yield self.perk(delay, color)
             yield from sleep(random.randrange(200, 300))
 
+    def launch(self, delay, color, start=None, done=None):
+        # Add a particle to the table, at start (default the top), to
+        # move first after delay ms. done, if given, is called with
+        # the color it falls out of the bottom with, or None if it
+        # reacts away or is quit.
+        i = self.n
+        if i == len(self.at):
+            self.at.append(0)
+            self.colors.extend(b'\0\0\0')
+            self.delays.append(0)
+            self.due.append(0)
+            self.done.append(None)
+        if start is None:
+            start = self.top_i
+        self.at[i] = start
+        k = 3*i
+        colors = self.colors
+        colors[k], colors[k+1], colors[k+2] = color
+        self.delays[i] = delay
+        self.due[i] = self.now + delay
+        self.done[i] = done
+        self.n = i + 1
+        self.add_color_to(start, color)
+        return i
+
+    def _move(self, dest, src):
+        self.at[dest] = self.at[src]
+        colors = self.colors
+        for k in range(3):
+            colors[3*dest + k] = colors[3*src + k]
+        self.delays[dest] = self.delays[src]
+        self.due[dest] = self.due[src]
+        self.done[dest] = self.done[src]
+
+    def tick(self, now):
+        # Move every particle that is due by now a step, as perk()
+        # would, and render once if any did. Returns whether the
+        # diagonal came out all stoichiometric (a bingo).
+        self.now = now
+        at = self.at
+        colors = self.colors
+        delays = self.delays
+        due = self.due
+        done = self.done
+        lattice = self.lattice
+        indexed_range = self.indexed_range
+        dirty = self.dirty
+        s0, s1, s2 = self.stoichiometric
+        moved = False
+        filled = False
+        n = self.n
+        j = 0
+        for q in range(n):
+            if due[q] > now:
+                if j != q:
+                    self._move(j, q)
+                j += 1
+                continue
+            moved = True
+            i = at[q]
+            k = 3*q
+            r, g, b = colors[k], colors[k+1], colors[k+2]
+            gone = False
+            out = None
+            if self.at_mid(i):
+                # React with what is at i
+                p = lattice[indexed_range[i]]
+                if p[0] > s0 or p[1] > s1 or p[2] > s2:
+                    # Leave the stoichiometric amount, carry on the rest
+                    r = p[0] - s0 if p[0] > s0 else 0
+                    g = p[1] - s1 if p[1] > s1 else 0
+                    b = p[2] - s2 if p[2] > s2 else 0
+                else:
+                    # Absorbed
+                    gone = True
+                    if p[0] == s0 and p[1] == s1 and p[2] == s2:
+                        filled = True
+            if not gone:
+                i1 = self.down(i, rng()&1)
+                pi = lattice[indexed_range[i]]
+                pi[0] -= r
+                pi[1] -= g
+                pi[2] -= b
+                dirty[indexed_range[i]] = 1
+                if i1 is None:
+                    # Out of the bottom
+                    gone = True
+                    out = bytes((r, g, b))
+                elif self.perk_quit:
+                    self.perk_quit -= 1
+                    gone = True
+                else:
+                    at[q] = i1
+                    colors[k], colors[k+1], colors[k+2] = r, g, b
+                    p1 = lattice[indexed_range[i1]]
+                    p1[0] += r
+                    p1[1] += g
+                    p1[2] += b
+                    dirty[indexed_range[i1]] = 1
+                    due[q] = now + delays[q]
+            if gone:
+                fun = done[q]
+                done[q] = None
+                if fun is not None:
+                    fun(out)
+            else:
+                if j != q:
+                    self._move(j, q)
+                j += 1
+        # Particles launched by the done functions go after the rest
+        for q in range(n, self.n):
+            self._move(j, q)
+            j += 1
+        for q in range(j, self.n):
+            done[q] = None
+        self.n = j
+        if moved:
+            self.update()
+        if filled:
+            # The diagonal is only checked in full when a point on it
+            # has just been filled, and then just the once
+            return self.diagonal_full()
+        return False
+
+    def diagonal_full(self):
+        s0, s1, s2 = self.stoichiometric
+        for i in range(7, 63, 7):
+            p = self[i]
+            if p[0] != s0 or p[1] != s1 or p[2] != s2:
+                return False
+        return True
+
+    @coroutine
+    def run(self, tick=10):
+        # Step the particle table every tick ms, for batched
+        loop = yield GetRunningLoop(None)
+        while True:
+            if self.tick(int(loop.time())):
+                print("bingo!")
+                yield self.bingo()
+            yield Sleep(tick)
+
 
@@ -98,11 +98,43 @@ class SPI:
     SLAVE = 'slave'
     LSB = 'lsb'
     MSB = 'msb'
+    # The transfer in flight on each bus, as [sent_at, wire_us], to
+    # simulate the time on the wire. Each bus has its own, so transfers
+    # on different buses overlap and those on the same bus don't.
+    _in_flight = {}
+    # Whether sends take as long as they would on the wire. Off, they
+    # are instant, so tests run quickly; timing tests turn it on.
+    wire_time = False
+
     def __init__(self, bus, *args, **kwargs):
         self.bus = bus
         self.recording_file = None
+        self.baudrate = kwargs.get('baudrate', 328125)
+        self._flight = self._in_flight.setdefault(bus, [micros(), 0])
+
+    def wire_micros(self, n):
+        # Time it takes to clock out n bytes
+        return n * 8 * 1000000 // self.baudrate
+
+    def busy(self):
+        sent_at, wire_us = self._flight
+        return elapsed_micros(sent_at) < wire_us
+
+    def wait(self):
+        while self.busy():
+            pass
 
     def send(self, data, *args, **kwargs):
+        # Blocks for as long as the real thing would (with wire_time)
+        self.send_nowait(data)
+        self.wait()
+
+    def send_nowait(self, data):
+        # Starts a transfer and returns while it is on the wire, as a
+        # DMA transfer would. The data must not change until not busy().
+        self.wait()
+        wire_us = self.wire_micros(len(data)) if self.wire_time else 0
+        self._flight[:] = [micros(), wire_us]
         f = self.recording_file
         if f:
             t = _time_as_8_bytes()
@@ -1,9 +1,10 @@
 import math
 import pyb
+from array import array
 
 from async_pyb import coroutine, sleep
 from lights import Lights
-from led_utils import display_list_for
+from led_utils import display_list_for, splat, splat_point
 
 π = math.pi
 two_pi = 2*π
@@ -56,6 +57,378 @@ class Ball:
         return s + '>'
 
 
+class BallStore:
+    # Balls kept as columns rather than as Ball objects: θ, ω and Fd in
+    # arrays of floats and the colors in a bytearray, 3 bytes a ball.
+    # Balls are numbered 0 to len()-1 and keep their order; removing a
+    # ball moves those after it down one.
+    #
+    # check, if given, is called as check(balls, i, θ, ω) after ball i
+    # is integrated from θ and ω, and returns whether to keep it. It
+    # may change the ball's columns, and add() balls, which join in
+    # from the next integrate().
+    #
+    # Once track()ing a ring of circumference pixels, the store keeps
+    # the pixel each ball is in, in the pixel column, and an index of
+    # the balls by pixel, as at the last integrate(). The index makes
+    # gates and collisions cost O(n) rather than O(n²):
+    #
+    #    balls.add_gate(θ, fun)  calls fun(balls, i, direction) when
+    #                            ball i crosses θ
+    #    balls.collide()         bounces balls off each other
+    #    balls.in_pixel(p)       yields the balls in pixel p
+
+    typecode = 'f'      # of the θ, ω and Fd columns
+
+    def __init__(self, capacity=16, check=None, circumference=None):
+        self.n = 0
+        self.theta = self._column(capacity)
+        self.omega = self._column(capacity)
+        self.Fd = self._column(capacity)
+        self.colors = bytearray(3*capacity)
+        self.pixel = array('h', (0 for i in range(capacity)))
+        self.next = array('h', (0 for i in range(capacity)))
+        self.check = check
+        self.heads = None
+        if circumference is not None:
+            self.track(circumference)
+
+    def _column(self, n):
+        return array(self.typecode, (0 for i in range(n)))
+
+    def track(self, circumference):
+        # Index the balls by pixel on a ring of circumference pixels,
+        # pixel 0 starting at θ = 0
+        self.circumference = circumference
+        self.pix_per_radian = circumference / two_pi
+        # A whole turn, half of it and one pixel, in the units of θ
+        self._turn, self._half, self._unit = self._units()
+        self.heads = array('h', (-1 for p in range(circumference)))
+        self.gates = [None] * circumference
+        pixel = self.pixel
+        for i in range(self.n):
+            pixel[i] = self._pixel(self.theta[i])
+        self._index()
+
+    def _units(self):
+        return two_pi, π, two_pi / self.circumference
+
+    def _pixel(self, θ):
+        return int(θ // self._unit) % self.circumference
+
+    def _index(self):
+        heads = self.heads
+        nxt = self.next
+        pixel = self.pixel
+        for p in range(len(heads)):
+            heads[p] = -1
+        for i in range(self.n - 1, -1, -1):
+            p = pixel[i]
+            nxt[i] = heads[p]
+            heads[p] = i
+
+    def in_pixel(self, p):
+        # The balls in pixel p, in no particular order
+        nxt = self.next
+        i = self.heads[p % self.circumference]
+        while i >= 0:
+            yield i
+            i = nxt[i]
+
+    def __len__(self):
+        return self.n
+
+    def capacity(self):
+        return len(self.theta)
+
+    def add(self, θ=0.0, ω=0.0, Fd=0.01, color=(8,0,0)):
+        # Add a ball, as Ball(θ, ω, Fd, color) would be, returning its
+        # number. Room for more is made by doubling.
+        i = self.n
+        if i == len(self.theta):
+            more = self._column(max(i, 1))
+            self.theta.extend(more)
+            self.omega.extend(more)
+            self.Fd.extend(more)
+            self.colors.extend(bytes(3*len(more)))
+            more = array('h', (0 for k in range(len(more))))
+            self.pixel.extend(more)
+            self.next.extend(more)
+        self._put(i, θ, ω, Fd)
+        colors = self.colors
+        colors[3*i], colors[3*i+1], colors[3*i+2] = color
+        self.n = i + 1
+        heads = self.heads
+        if heads is not None:
+            p = self.pixel[i] = self._pixel(self.theta[i])
+            self.next[i] = heads[p]
+            heads[p] = i
+        return i
+
+    def _put(self, i, θ, ω, Fd):
+        θ %= two_pi
+        if θ >= π:
+            θ -= two_pi
+        self.theta[i] = θ
+        self.omega[i] = ω
+        self.Fd[i] = Fd
+
+    def color_of(self, i):
+        return tuple(self.colors[3*i:3*i+3])
+
+    def _move(self, dest, src):
+        self.theta[dest] = self.theta[src]
+        self.omega[dest] = self.omega[src]
+        self.Fd[dest] = self.Fd[src]
+        self.pixel[dest] = self.pixel[src]
+        colors = self.colors
+        for k in range(3):
+            colors[3*dest + k] = colors[3*src + k]
+
+    def remove(self, i):
+        n = self.n
+        if not 0 <= i < n:
+            raise IndexError("tried to remove ball", i, "of", n)
+        for k in range(i + 1, n):
+            self._move(k - 1, k)
+        self.n = n - 1
+        if self.heads is not None:
+            self._index()
+
+    def clear(self):
+        self.n = 0
+        if self.heads is not None:
+            self._index()
+
+    def add_gate(self, θ, fun):
+        # Call fun(balls, i, direction) whenever ball i crosses θ, taken
+        # to the nearest pixel boundary, direction being 1 if θ is
+        # increasing and -1 if not. fun returns whether to keep the
+        # ball, and may add() balls as check may. One gate a boundary.
+        b = round(θ * self.pix_per_radian) % self.circumference
+        self.gates[b] = fun
+
+    def _track(self):
+        # Note the pixel each ball is now in, calling the gates at the
+        # pixel boundaries it crossed to get there, and index the balls
+        theta = self.theta
+        pixel = self.pixel
+        gates = self.gates
+        c = self.circumference
+        half = c >> 1
+        n = self.n
+        j = 0
+        for i in range(n):
+            p0 = pixel[i]
+            p1 = self._pixel(theta[i])
+            keep = True
+            if p1 != p0:
+                pixel[i] = p1
+                d = (p1 - p0) % c
+                if d <= half:
+                    # Up, over boundaries p0+1 to p1
+                    for b in range(p0 + 1, p0 + d + 1):
+                        gate = gates[b % c]
+                        if gate is not None and not gate(self, i, 1):
+                            keep = False
+                            break
+                else:
+                    # Down, over boundaries p0 to p1+1
+                    for b in range(p0, p0 - (c - d), -1):
+                        gate = gates[b % c]
+                        if gate is not None and not gate(self, i, -1):
+                            keep = False
+                            break
+            if keep:
+                if j != i:
+                    self._move(j, i)
+                j += 1
+        for i in range(n, self.n):
+            self._move(j, i)
+            j += 1
+        self.n = j
+        self._index()
+
+    def collide(self, distance=1.0):
+        # Bounce balls off each other: any two less than distance
+        # pixels apart (at most 1) and closing swap their ω, as balls
+        # of equal mass do. Only balls in the same or the next pixel
+        # are compared, and each pair just once: on a ring of two
+        # pixels, the next of the last is the first, already compared.
+        theta = self.theta
+        omega = self.omega
+        heads = self.heads
+        nxt = self.next
+        c = self.circumference
+        turn = self._turn
+        half = self._half
+        limit = distance * self._unit
+        # The pixels whose next pixel is to be compared with them
+        onto = c if c > 2 else c - 1
+        for p in range(c):
+            a = heads[p]
+            while a >= 0:
+                # The rest of pixel p after a, then pixel p+1
+                b = nxt[a]
+                q = p
+                while True:
+                    if b < 0:
+                        if q != p or p >= onto:
+                            break
+                        q = (p + 1) % c
+                        b = heads[q]
+                        continue
+                    gap = (theta[b] - theta[a] + half) % turn - half
+                    if -limit < gap < limit and gap != 0:
+                        ωa = omega[a]
+                        ωb = omega[b]
+                        if (ωa > ωb) if gap > 0 else (ωa < ωb):
+                            omega[a] = ωb
+                            omega[b] = ωa
+                    b = nxt[b]
+                a = nxt[a]
+
+    def integrate(self, dt, g_per_r=0.0):
+        # Integrate all the balls over dt, as Ball.integrate does under
+        # an acceleration of g_per_r * sin(θ), dropping those check
+        # doesn't keep and closing up the gaps as it goes
+        theta = self.theta
+        omega = self.omega
+        Fd = self.Fd
+        check = self.check
+        sin = math.sin
+        n = self.n
+        j = 0
+        for i in range(n):
+            θ = theta[i]
+            ω = omega[i]
+            ω1 = ω + (g_per_r * sin(θ) - Fd[i] * ω * abs(ω)) * dt
+            θ1 = (θ + (ω + ω1) * 0.5 * dt) % two_pi
+            if θ1 >= π:
+                θ1 -= two_pi
+            theta[i] = θ1
+            omega[i] = ω1
+            if check is None or check(self, i, θ, ω):
+                if j != i:
+                    self._move(j, i)
+                j += 1
+        # Balls added by check go after the survivors
+        for i in range(n, self.n):
+            self._move(j, i)
+            j += 1
+        self.n = j
+        if self.heads is not None:
+            self._track()
+
+    def splat(self, points, pix_per_radian, blur=1.0, offset=0, wrap=None):
+        # Splat all the balls into points (see led_utils.splat)
+        theta = self.theta
+        colors = self.colors
+        for i in range(self.n):
+            k = 3*i
+            splat_point(points, theta[i] * pix_per_radian,
+                        colors[k], colors[k+1], colors[k+2],
+                        blur, offset, wrap)
+
+
+class FixedBallStore(BallStore):
+    # A BallStore for a ring of circumference pixels that integrates in
+    # fixed point, with sin() from a table, so a tick takes no float
+    # arithmetic at all. θ and ω are kept in pixels and pixels per
+    # second with 12 fraction bits, and Fd as the drag per pixel per
+    # second, with 16. add() takes and theta_of() and omega_of() give
+    # radians, but check gets θ and ω as they are kept.
+    #
+    # The sine table has sine_steps entries per pixel, so angles are
+    # taken to 1/sine_steps of a pixel, and sin() to 1/16384.
+
+    typecode = 'i'
+    sine_steps = 16
+
+    def __init__(self, circumference, capacity=16, check=None):
+        super().__init__(capacity, check)
+        self.turn = circumference << 12
+        # θ >> _shift is θ in 1/sine_steps pixels, sine_steps being a
+        # power of 2
+        shift = 12
+        k = self.sine_steps
+        while k > 1:
+            k >>= 1
+            shift -= 1
+        self._shift = shift
+        n = circumference * self.sine_steps
+        self.sines = array('h', (round(16384 * math.sin(two_pi * k / n))
+                                 for k in range(n)))
+        self.track(circumference)
+
+    def _units(self):
+        return self.turn, self.turn >> 1, 4096
+
+    def _pixel(self, θ):
+        return (θ >> 12) % self.circumference
+
+    def _put(self, i, θ, ω, Fd):
+        ppr = self.pix_per_radian
+        half = self.turn >> 1
+        self.theta[i] = (round(θ * ppr * 4096) + half) % self.turn - half
+        self.omega[i] = round(ω * ppr * 4096)
+        self.Fd[i] = round(Fd / ppr * 65536)
+
+    def theta_of(self, i):
+        return self.theta[i] / (4096 * self.pix_per_radian)
+
+    def omega_of(self, i):
+        return self.omega[i] / (4096 * self.pix_per_radian)
+
+    def integrate(self, dt, g_per_r=0.0):
+        # As BallStore.integrate, in fixed point. In pixels, the
+        # acceleration g_per_r * sin(θ) is g sin(θ) and the drag is
+        # Fd/pix_per_radian ω|ω|.
+        theta = self.theta
+        omega = self.omega
+        Fd = self.Fd
+        check = self.check
+        sines = self.sines
+        n_sines = len(sines)
+        shift = self._shift
+        turn = self.turn
+        half = turn >> 1
+        g8 = round(g_per_r * self.pix_per_radian * 256)  # px/s², 8 bits
+        dt16 = round(dt * 65536)
+        n = self.n
+        j = 0
+        for i in range(n):
+            θ = theta[i]
+            ω = omega[i]
+            a = g8 * sines[(θ >> shift) % n_sines] >> 10
+            w = ω >> 4
+            a -= ((w * abs(w)) >> 8) * Fd[i] >> 12
+            ω1 = ω + ((a * dt16 + 0x8000) >> 16)
+            θ1 = θ + (((ω + ω1) * dt16 + 0x10000) >> 17)
+            θ1 = (θ1 + half) % turn - half
+            theta[i] = θ1
+            omega[i] = ω1
+            if check is None or check(self, i, θ, ω):
+                if j != i:
+                    self._move(j, i)
+                j += 1
+        for i in range(n, self.n):
+            self._move(j, i)
+            j += 1
+        self.n = j
+        self._track()
+
+    def splat(self, points, pix_per_radian, blur=1.0, offset=0, wrap=None):
+        # θ is already in pixels
+        theta = self.theta
+        colors = self.colors
+        for i in range(self.n):
+            k = 3*i
+            splat_point(points, theta[i] / 4096,
+                        colors[k], colors[k+1], colors[k+2],
+                        blur, offset, wrap)
+
+
 class RingRamp(Lights):
     # A ring-shaped ramp for balls in gravity
     # The balls ghost through each other
@@ -66,11 +439,20 @@ class RingRamp(Lights):
     #
     # To suit the neopixel rings, we adopt θ = 0 at the bottom,
     # and clockwise as the direction of increasing θ
+    #
+    # The balls are a list of Ball, or a BallStore for many of them, in
+    # which case ball_check_fun is not used (see BallStore.check) and
+    # the store tracks the ring, for gates and collide_within. With
+    # fixed_point, they are a FixedBallStore, which integrates without
+    # floats.
     def __init__(self, circumference=None,
                  bottom=0,
                  g=-1.0,
                  blur=None,
                  ball_check_fun=lambda b, θ, ω :[b],
+                 balls=None,
+                 fixed_point=False,
+                 collide_within=None,
                  *args, **kwargs):
         super().__init__(*args, **kwargs)
 #        super().__init__(lights)
@@ -83,10 +465,23 @@ class RingRamp(Lights):
         self.pix_per_radian = self.circumference / two_pi
         self.r = self.circumference / two_pi
         self.blur = blur
-        self.balls = []
+        if balls is None:
+            # Fixed point wants its balls in a FixedBallStore
+            balls = FixedBallStore(self.circumference) if fixed_point else []
+        elif isinstance(balls, BallStore) and balls.heads is None:
+            balls.track(self.circumference)
+        self.balls = balls
+        # With a BallStore, balls closer than this many pixels bounce
+        self.collide_within = collide_within
         self.ball_check_fun = ball_check_fun
 
     def integrate(self, dt):
+        balls = self.balls
+        if isinstance(balls, BallStore):
+            balls.integrate(dt, self.g / self.r)
+            if self.collide_within:
+                balls.collide(self.collide_within)
+            return
         next_balls = []
         for ball in self.balls:
             θ = ball.θ
@@ -104,29 +499,23 @@ class RingRamp(Lights):
     def gen_RGBs(self):
         c = self.circumference
         bottom = self.bottom
-        length = len(self)
 
         self.clear()
 
-        for ball in self.balls:
-            # DEBUG:
-            if sum(ball.color) == 0:
-                print("dark ball", ball)
-
-            for i, color in self.display_list_for_angle(ball.θ, ball.color, self.blur):
-                # Input positions in pixel circle space
-                # Rotates to LED space and clips to available arc
-                k = (i + bottom) % c
-                if k < length:
-                    self.add_color_to(k, color)
+        # Input positions in pixel circle space
+        # Rotates to LED space and clips to available arc
+        ppr = self.pix_per_radian
+        balls = self.balls
+        if isinstance(balls, BallStore):
+            balls.splat(self, ppr, self.blur, bottom, c)
+        else:
+            splat(self, ((ball.θ * ppr, ball.color) for ball in balls),
+                  self.blur, bottom, c)
 
-        b = round(self.brightness * 256)
-        for p in self:
-            yield (min((b*v + 128) >> 8, 255) for v in p)
+        yield from super().gen_RGBs()
 
     def show_balls(self):
-        self.render()
-        self.leds.sync()
+        self.update()
 
     def was_show_balls(self):
         c = self.circumference
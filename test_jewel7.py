@@ -102,6 +102,28 @@ class Jewel7TestCase(unittest.TestCase):
         # LEDs as expected
         self.assertEqual(list(tuple(led) for led in ws), expect)
 
+    def test_Jewel7_rendering_floats(self):
+        # Float colors, as the feed rollers spin, render scaled, rounded
+        # and clamped
+        ws = self.ws
+        j7 = self.jewel7
+        j7.center = (0, 0, 1)
+        v = 1.0
+        for i in range(len(j7.gear)):
+            j7.gear[i] = [v, 0, 0]
+            v *= 0.3
+        j7.brightness = 31
+        j7.render()
+        self.assertEqual([tuple(led) for led in ws[1:8]],
+                         [(0,0,31), (31,0,0), (9,0,0), (3,0,0), (1,0,0),
+                          (0,0,0), (0,0,0)])
+        j7.brightness = 1000
+        j7.gear[5] = [-2.5, 0.2, 300]
+        j7.render()
+        self.assertEqual([tuple(led) for led in ws[1:8]],
+                         [(0,0,255), (255,0,0), (255,0,0), (90,0,0),
+                          (27,0,0), (8,0,0), (0,200,255)])
+
 def main():
     unittest.main()
     return
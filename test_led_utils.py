@@ -7,7 +7,8 @@ import pyb
 import gc
 import uctypes
 
-from led_utils import _fillwords, _movewords
+from led_utils import _fillwords, _movewords, _reverseblocks, \
+    gaussian_blur_weights, display_list_for, blur_kernel, splat, kernel_steps
 
 #log = logging.getLogger("test_ws2812")
 
@@ -112,6 +113,87 @@ class AsmTestCase(unittest.TestCase):
         _movewords(a+2*4, a, 6)
         self.assertEqual(list(b), list(ref))
 
+    def test_reverseblocks(self):
+        b = bytearray(range(12*4))
+        ref = b[:]
+        a = uctypes.addressof(b)
+
+        # Reversing no blocks, or one, does nothing
+        _reverseblocks(a, 0, 3)
+        self.assertEqual(b, ref)
+        _reverseblocks(a, 1, 3)
+        self.assertEqual(b, ref)
+
+        # Blocks are reversed whole, odd or even in number
+        for n in (2, 3, 4):
+            b = bytearray(range(12*4))
+            a = uctypes.addressof(b)
+            ref = b[:]
+            for i in range(n):
+                j = n - 1 - i
+                ref[12*i:12*(i+1)] = b[12*j:12*(j+1)]
+            _reverseblocks(a, n, 3)
+            self.assertEqual(list(b), list(ref))
+
+        # Single words too
+        b = bytearray(range(8*4))
+        a = uctypes.addressof(b)
+        ref = b[:]
+        for i in range(5):
+            ref[4*(1+i):4*(2+i)] = b[4*(5-i):4*(6-i)]
+        _reverseblocks(a+4, 5, 1)
+        self.assertEqual(list(b), list(ref))
+
+
+class BlurTestCase(unittest.TestCase):
+
+    def test_kernel(self):
+        # Kernels are the blur weights, at sub-pixel steps
+        for blur in (None, 0.5, 1.0, 2.5):
+            for x in (0.0, 3.25, -7.5 + 1/kernel_steps, 10.4375):
+                first, weights = blur_kernel(x, blur)
+                ref = gaussian_blur_weights(x, blur)
+                self.assertEqual(first, ref[0][0])
+                self.assertEqual(len(weights), len(ref))
+                for w, (i, rw) in zip(weights, ref):
+                    self.assertTrue(abs(w / 65536 - rw) < 1/65536 + 1e-6,
+                                    (x, blur, w, rw))
+
+    def test_kernel_cache(self):
+        # Positions at the same sub-pixel step share a kernel
+        f0, w0 = blur_kernel(2.25, 1.5)
+        f1, w1 = blur_kernel(-4.75, 1.5)
+        f2, w2 = blur_kernel(2.25 + 0.1/kernel_steps, 1.5)
+        self.assertIs(w0, w1)
+        self.assertIs(w0, w2)
+        self.assertEqual((f1 - f0, f2 - f0), (-7, 0))
+        self.assertIsNot(blur_kernel(2.25, 1.0)[1], w0)
+
+    def test_splat(self):
+        # Splatting adds what display_list_for gives, give or take
+        # rounding
+        sources = [(3.25, (200, 100, 0)), (5.5, (0, 50, 250)),
+                   (0.125, (30, 60, 90))]
+        n = 12
+        for blur, offset, wrap in ((1.0, 0, None), (None, 2, None),
+                                   (0.7, 4, n), (2.0, -3, 10)):
+            points = [bytearray(3) for i in range(n)]
+            splat(points, sources, blur, offset, wrap)
+            ref = [[0, 0, 0] for i in range(n)]
+            for x, color in sources:
+                for i, c in display_list_for(x, color, blur):
+                    i += offset
+                    if wrap:
+                        i %= wrap
+                    if 0 <= i < n:
+                        for k in range(3):
+                            ref[i][k] += c[k]
+            for p, r in zip(points, ref):
+                for v, rv in zip(p, r):
+                    self.assertTrue(abs(v - rv) <= 1,
+                                    (blur, offset, wrap, list(p), r))
+            self.assertTrue(sum(sum(p) for p in points) > 0)
+
 
 
 def main():
@@ -8,7 +8,7 @@ import gc
 #import random
 
 from ws2812 import WS2812
-from lights import Lights
+from lights import Lights, FrameScheduler
 
 #log = logging.getLogger("test_ws2812")
 
@@ -217,6 +217,375 @@ class LightSliceTestCaseMore(unittest.TestCase):
         self.assertEqual(list(v for v in sls), (1,2,3,4)) # Note NOT a list, it's been replaced
 
 
+class ContiguousLatticeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.ws = WS2812(1, 8)
+        self.lights = lights = Lights(self.ws, lattice_type='B')
+        for i, c in enumerate(tg(len(lights), 0)):
+            lights[i] = c
+
+    def tearDown(self):
+        self.ws = self.lights = None
+        gc.collect()
+
+    def test_store(self):
+        lights = self.lights
+        flat = bytes(v for c in tg(len(lights), 0) for v in c)
+        self.assertEqual(bytes(lights.store), flat)
+        # Points are views of the store
+        lights[2][1] = 99
+        self.assertEqual(lights.store[7], 99)
+        # Slices share the store, as they share the lattice
+        sls = lights[2:5]
+        self.assertIs(sls.store, lights.store)
+        self.assertIsNone(Lights(self.ws).store)
+        # A point holds three values, and isn't replaced
+        p = lights[0]
+        with self.assertRaises(IndexError):
+            lights[0] = (1, 2, 3, 4)
+        self.assertIs(lights[0], p)
+
+    def test_clear(self):
+        lights = self.lights
+        expect = [tuple(c) for c in tg(len(lights), 0)]
+        lights[2:5].clear()
+        expect[2:5] = [(0, 0, 0)] * 3
+        self.assertEqual([tuple(p) for p in lights], expect)
+        lights[-1:-8:-3].clear()
+        expect[7] = expect[1] = (0, 0, 0)
+        self.assertEqual([tuple(p) for p in lights], expect)
+        lights.clear()
+        self.assertEqual(sum(lights.store), 0)
+
+    def test_render(self):
+        lights = self.lights
+        ws = self.ws
+        lights.render()
+        self.assertEqual([tuple(p) for p in ws],
+                         [tuple(c) for c in tg(len(lights), 0)])
+        lights[3] = (7, 8, 9)
+        lights[1:6:2].render()
+        self.assertEqual(tuple(ws[3]), (7, 8, 9))
+        lights[5] = (1, 1, 1)
+        lights[4:6].render()
+        self.assertEqual(tuple(ws[5]), (1, 1, 1))
+        # Another model of the same lattice renders its own way
+        class Dim(Lights):
+            # Renders all its points, being another model of the lattice
+            def model_colors(self):
+                for p in super().model_colors():
+                    yield bytes(v // 2 for v in p)
+        Dim(lights=lights).render()
+        self.assertEqual(tuple(ws[3]), (3, 4, 4))
+
+    def test_render_brightness(self):
+        # Brightness goes through a table, built as it is set, and the
+        # store through it in one go
+        lights = self.lights
+        self.assertIsNone(lights._table)
+        lights.brightness = 0.5
+        table = lights._table
+        self.assertEqual(len(table), 256)
+        self.assertEqual((table[0], table[1], table[10], table[255]),
+                         (0, 1, 5, 128))
+        lights.render()
+        self.assertEqual([tuple(p) for p in self.ws],
+                         [tuple((v + 1) // 2 for v in c)
+                          for c in tg(len(lights), 0)])
+        # Incrementally too
+        lights[3] = (20, 40, 255)
+        lights.render()
+        self.assertEqual(tuple(self.ws[3]), (10, 20, 128))
+        lights.brightness = 0.25
+        self.assertIs(lights._table, table)
+        lights.brightness = 1
+        self.assertIsNone(lights._table)
+        lights.render()
+        self.assertEqual(tuple(self.ws[3]), (20, 40, 255))
+
+    def test_signed(self):
+        lights = Lights(self.ws, lattice_type='h')
+        lights.add_color_to(1, (5, 5, 5))
+        lights.sub_color_from(1, (8, 3, 5))
+        self.assertEqual(tuple(lights[1]), (-3, 2, 0))
+        # Values past 0-255 render clamped, in full and incrementally
+        lights.add_color_to(2, (300, 255, 256))
+        lights.render()
+        self.assertEqual(tuple(self.ws[1]), (0, 2, 0))
+        self.assertEqual(tuple(self.ws[2]), (255, 255, 255))
+        lights.add_color_to(3, (-1, 1000, 7))
+        lights.sub_color_from(2, (400, 0, 0))
+        lights.render()
+        self.assertEqual(tuple(self.ws[2]), (0, 255, 255))
+        self.assertEqual(tuple(self.ws[3]), (0, 255, 7))
+        lights.clear()
+        self.assertEqual(list(lights.store), [0] * 24)
+
+
+class RecordingWS2812(WS2812):
+    # Notes the LEDs set one by one, as a render sets them
+    def __init__(self, *args, **kwargs):
+        self.set = []
+        super().__init__(*args, **kwargs)
+
+    def set_led(self, index, value):
+        if isinstance(index, int):
+            self.set.append(index)
+        super().set_led(index, value)
+
+    __setitem__ = set_led
+
+
+class IncrementalRenderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.ws = RecordingWS2812(1, 8)
+        self.lights = lights = Lights(self.ws)
+        for i, c in enumerate(tg(len(lights), 0)):
+            lights[i] = c
+        lights.render()
+
+    def tearDown(self):
+        self.ws = self.lights = None
+        gc.collect()
+
+    def watch(self):
+        # Start noting which leds a render sets
+        self.ws.set = []
+
+    def rendered(self):
+        return sorted(set(self.ws.set))
+
+    def test_all_clean_after_render(self):
+        self.assertEqual(list(self.lights.dirty), [0] * 8)
+        self.assertEqual([tuple(p) for p in self.ws],
+                         [tuple(c) for c in tg(8, 0)])
+
+    def test_only_changed(self):
+        lights = self.lights
+        self.watch()
+        lights.render()
+        self.assertEqual(self.rendered(), [])
+        lights.set_color_of(3, (1, 2, 3))
+        lights.add_color_to(5, (1, 1, 1))
+        lights.sub_color_from(6, (1, 1, 1))
+        lights[1] = (7, 7, 7)
+        lights[-1:] = [(9, 9, 9)]
+        lights.render()
+        self.assertEqual(self.rendered(), [1, 3, 5, 6, 7])
+        self.assertEqual(tuple(self.ws[3]), (1, 2, 3))
+        self.assertEqual(tuple(self.ws[6]), (17, 18, 19))
+
+    def test_sliced(self):
+        # Slices share the flags, as they share the lattice
+        lights = self.lights
+        sls = lights[::2]
+        self.assertIs(sls.dirty, lights.dirty)
+        # A new Lights renders all of its points the first time
+        self.watch()
+        sls.render()
+        self.assertEqual(self.rendered(), [0, 2, 4, 6])
+        lights.render()
+        sls.clear()
+        self.watch()
+        lights.render()
+        self.assertEqual(self.rendered(), [0, 2, 4, 6])
+        # A slice renders only its own changes
+        lights.mark_dirty(1)
+        sls.mark_dirty(1)
+        self.watch()
+        sls.render()
+        self.assertEqual(self.rendered(), [2])
+        self.assertEqual(lights.dirty[1], 1)
+
+    def test_direct_writes(self):
+        lights = self.lights
+        lights.lattice[4][0] = 100
+        self.watch()
+        lights.render()
+        self.assertEqual(self.rendered(), [])
+        lights.mark_dirty(4)
+        lights.render()
+        self.assertEqual(self.rendered(), [4])
+        # Without incremental rendering, everything is rendered
+        lights.incremental = False
+        self.watch()
+        lights.render()
+        self.assertEqual(self.rendered(), list(range(8)))
+
+    def test_brightness(self):
+        # A change of brightness renders everything again
+        lights = self.lights
+        lights.brightness = 0.5
+        self.watch()
+        lights.render()
+        self.assertEqual(self.rendered(), list(range(8)))
+        self.assertEqual(tuple(self.ws[2]), (3, 4, 4))
+        self.watch()
+        lights.render()
+        self.assertEqual(self.rendered(), [])
+        # And so does a change of gamma, which is the Lights' own
+        lights.gamma = 2
+        self.assertEqual(self.ws.gamma, 1)
+        self.watch()
+        lights.render()
+        self.assertEqual(self.rendered(), list(range(8)))
+        # Applied before brightness, through one table
+        self.assertEqual(tuple(self.ws[7]), (1, 1, 1))
+        self.assertEqual(tuple(self.lights[7]), (21, 22, 23))
+        other = Lights(self.ws)
+        other[0] = (255, 128, 0)
+        other.gamma = 2.2
+        other.render()
+        self.assertEqual(tuple(self.ws[0]), (255, 56, 0))
+        self.assertEqual(other.gamma, 2.2)
+        self.assertEqual(lights.gamma, 2)
+        # Floats are worked out the same way
+        other[0] = [255.0, 128.0, -3.0]
+        other.render()
+        self.assertEqual(tuple(self.ws[0]), (255, 56, 0))
+
+    def test_other_writers(self):
+        # Leds written by anything else are all rendered again
+        lights = self.lights
+        self.ws[3] = (255, 255, 255)
+        self.watch()
+        lights.render()
+        self.assertEqual(self.rendered(), list(range(8)))
+        self.assertEqual(tuple(self.ws[3]), (9, 10, 11))
+        # Such as another Lights on the same leds
+        other = Lights(self.ws)
+        other[5] = (1, 1, 1)
+        other.render()
+        self.watch()
+        lights.render()
+        self.assertEqual([tuple(p) for p in self.ws],
+                         [tuple(c) for c in tg(8, 0)])
+        self.watch()
+        other.render()
+        self.assertEqual(tuple(self.ws[5]), (1, 1, 1))
+        # But not a slice of the same lattice
+        lights.render()
+        sls = lights[2:5]
+        sls.render()
+        sls[2] = (7, 7, 7)
+        self.watch()
+        sls.render()
+        self.assertEqual(self.rendered(), [4])
+        self.watch()
+        lights[1] = (6, 6, 6)
+        lights.render()
+        self.assertEqual(self.rendered(), [1])
+        self.assertEqual(tuple(self.ws[4]), (7, 7, 7))
+
+
+class CountingLights(Lights):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.renders = 0
+
+    def render(self):
+        self.renders += 1
+        super().render()
+
+
+class FrameSchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.ws = ws = WS2812(1, 8)
+        self.syncs = 0
+        sync = ws.sync
+        def counting_sync(*args):
+            self.syncs += 1
+            sync(*args)
+        ws.sync = counting_sync
+        self.frames = frames = FrameScheduler(ws, fps=50)
+        lights = Lights(ws, scheduler=frames)
+        self.a = CountingLights(lights=lights[:4])
+        self.b = CountingLights(lights=lights[4:])
+
+    def tearDown(self):
+        self.ws = self.a = self.b = self.frames = None
+        gc.collect()
+
+    def test_inherits_scheduler(self):
+        self.assertIs(self.a.scheduler, self.frames)
+        self.assertIs(self.a[1:].scheduler, self.frames)
+        self.assertIsNone(Lights(self.ws).scheduler)
+
+    def test_coalesce(self):
+        a, b, frames = self.a, self.b, self.frames
+        a.set_color_of(0, (1, 2, 3))
+        b.set_color_of(3, (4, 5, 6))
+        for i in range(3):
+            a.update()
+            b.update()
+        # Nothing happens until the frame
+        self.assertEqual((a.renders, b.renders, self.syncs), (0, 0, 0))
+        self.assertTrue(a.leds_need_sync)
+        self.assertTrue(frames.frame())
+        # One render of each and one sync for them all
+        self.assertEqual((a.renders, b.renders, self.syncs), (1, 1, 1))
+        self.assertFalse(a.leds_need_sync or b.leds_need_sync)
+        self.assertEqual(tuple(self.ws[0]), (1, 2, 3))
+        self.assertEqual(tuple(self.ws[7]), (4, 5, 6))
+        # An idle frame does nothing
+        self.assertFalse(frames.frame())
+        self.assertEqual((frames.frames, self.syncs), (1, 1))
+        # Only the Lights asking are rendered
+        b.update()
+        frames.frame()
+        self.assertEqual((a.renders, b.renders, self.syncs), (1, 2, 2))
+
+    def test_watch(self):
+        a, frames = self.a, self.frames
+        frames.watch(a)
+        frames.watch(a)
+        self.assertFalse(frames.frame())
+        a.leds_need_sync = True
+        self.assertTrue(frames.frame())
+        self.assertEqual((a.renders, self.syncs), (1, 1))
+        self.assertFalse(a.leds_need_sync)
+
+    def test_update_unscheduled(self):
+        # Without a scheduler, update() renders and syncs right away
+        a = CountingLights(self.ws)
+        a.update()
+        self.assertEqual((a.renders, self.syncs), (1, 1))
+
+    def test_deadlines(self):
+        frames = self.frames
+        self.assertEqual(frames.period, 20)
+        # On time, or late within the frame
+        self.assertEqual(frames.next_deadline(100, 100), 120)
+        self.assertEqual(frames.next_deadline(100, 119), 120)
+        self.assertEqual(frames.missed, 0)
+        # Past the next deadline: missed, and the frames passed dropped
+        self.assertEqual(frames.next_deadline(100, 165), 180)
+        self.assertEqual((frames.missed, frames.dropped), (1, 3))
+        frames.stride = 2
+        self.assertEqual(frames.next_deadline(100, 100), 140)
+
+    def test_adapt(self):
+        frames = self.frames
+        frames.adapt(15)
+        self.assertEqual(frames.stride, 1)
+        # Slow frames back off, up to max_stride
+        frames.adapt(25)
+        self.assertEqual(frames.stride, 2)
+        for i in range(20):
+            frames.adapt(1000)
+        self.assertEqual(frames.stride, frames.max_stride)
+        # Fast frames speed up again, but not at once
+        for i in range(frames.easy_frames - 1):
+            frames.adapt(5)
+        self.assertEqual(frames.stride, frames.max_stride)
+        frames.adapt(5)
+        self.assertEqual(frames.stride, frames.max_stride - 1)
+        for i in range(100 * frames.easy_frames):
+            frames.adapt(5)
+        self.assertEqual(frames.stride, 1)
+        self.assertEqual(frames.frame_ms, 5)
+
+
 def main():
     unittest.main()
     return
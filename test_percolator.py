@@ -54,6 +54,26 @@ class PercolatorTestCase(unittest.TestCase):
         print("%d renders average %f ms" % (n, average_ms), end='')
         self.assertTrue(average_ms < 15, "average render time %f ms" % (average_ms))
 
+    def test_render_time_sparse(self):
+        # Rendering a change to one cell takes much less time than
+        # rendering the lot
+        p = self.p
+        n = 10
+        t0 = pyb.micros()
+        for i in range(n):
+            p.mark_dirty()
+            p.render()
+        full_us = pyb.elapsed_micros(t0)
+        t0 = pyb.micros()
+        for i in range(n):
+            p.add_color_to(i, (1, 2, 3))
+            p.render()
+        sparse_us = pyb.elapsed_micros(t0)
+        print(" full %f ms, sparse %f ms" % (full_us / (n * 1000),
+                                             sparse_us / (n * 1000)), end='')
+        self.assertTrue(sparse_us < full_us / 4, (sparse_us, full_us))
+        self.assertEqual(tuple(self.ws[3]), (1, 2, 3))
+
     def test_render_at_index_0(self):
         # A Percolator can render itself to the backing LEDs
         lattice = self.p.lattice
@@ -89,6 +109,107 @@ class PercolatorTestCase(unittest.TestCase):
         for led, g in zip(self.ws, tg(64,0)):
             self.assertEqual(tuple(led), tuple(g))
 
+    def test_contiguous_lattice(self):
+        # add_color_to and sub_color_from work on a contiguous lattice,
+        # and a signed one takes a color past 0 and back
+        for lattice_type in ('B', 'h'):
+            p = Percolator(self.ws, lattice_type=lattice_type)
+            self.assertEqual(len(p.store), 3*64)
+            p.add_color_to(9, (10, 20, 30))
+            p.add_color_to(9, (1, 2, 3))
+            self.assertEqual(tuple(p.lattice[9]), (11, 22, 33))
+            self.assertEqual(tuple(p.store[27:30]), (11, 22, 33))
+            p.render()
+            self.assertEqual(tuple(self.ws[9]), (11, 22, 33))
+            self.assertEqual(sum(sum(v) for v in self.ws), 66)
+            p.sub_color_from(9, (11, 22, 33))
+            if lattice_type == 'h':
+                p.sub_color_from(9, (5, 5, 5))
+                self.assertEqual(tuple(p.lattice[9]), (-5, -5, -5))
+                p.render()
+                self.assertEqual(tuple(self.ws[9]), (0, 0, 0))
+                p.add_color_to(9, (5, 5, 5))
+            self.assertEqual(tuple(p.lattice[9]), (0, 0, 0))
+
+
+class BatchedPercolatorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.ws = WS2812(1,64)
+        self.p = Percolator(self.ws, batched=True)
+        self.renders = 0
+        render = self.p.render
+        def counted():
+            self.renders += 1
+            render()
+        self.p.render = counted
+
+    def tearDown(self):
+        self.ws = self.p = None
+        gc.collect()
+
+    def test_falls_out(self):
+        # A particle moves a step each delay, leaves the stoichiometric
+        # amount at the diagonal, and falls out of the bottom with the rest
+        p = self.p
+        out = []
+        p.launch(10, (8,0,0), done=out.append)
+        self.assertEqual(tuple(p[63]), (8,0,0))
+        self.assertFalse(p.tick(5))
+        self.assertEqual(self.renders, 0)
+        for t in range(10, 150, 10):
+            p.tick(t)
+            self.assertEqual(p.n, 1)
+            self.assertEqual(sum(sum(v) for v in p.lattice), 8)
+        self.assertEqual(self.renders, 14)
+        self.assertEqual(p.at[0], 0)
+        p.tick(150)
+        self.assertEqual(out, [b'\7\0\0'])
+        self.assertEqual(p.n, 0)
+        # All but what it left on the diagonal
+        self.assertEqual(sum(sum(v) for v in p.lattice), 1)
+        self.assertEqual(sum(sum(v) for v in self.ws), 1)
+
+    def test_absorbed_and_bingo(self):
+        p = self.p
+        out = []
+        p.launch(10, (1,1,1), 7, out.append)
+        self.assertFalse(p.tick(10))
+        self.assertEqual(out, [None])
+        self.assertEqual(p.n, 0)
+        self.assertEqual(tuple(p[7]), (1,1,1))
+        for i in range(14, 63, 7):
+            p.set_color_of(i, p.stoichiometric)
+        p.set_color_of(56, (0,0,0))
+        p.launch(10, (1,1,1), 56, out.append)
+        self.assertTrue(p.tick(20))
+        self.assertEqual(out, [None, None])
+
+    def test_quit(self):
+        p = self.p
+        out = []
+        p.perk_quit = 1
+        p.launch(10, (0,8,0), done=out.append)
+        p.launch(10, (0,0,8), done=out.append)
+        p.tick(10)
+        self.assertEqual(out, [None])
+        self.assertEqual(p.n, 1)
+        self.assertEqual(p.perk_quit, 0)
+        self.assertEqual(sum(sum(v) for v in p.lattice), 8)
+
+    def test_one_render_per_tick(self):
+        # However many particles move in a tick, it renders once
+        p = self.p
+        for k in range(20):
+            p.launch(10 + k % 3, (1,2,3))
+        p.tick(10)
+        self.assertEqual(self.renders, 1)
+        self.assertEqual(p.n, 20)
+        self.assertEqual(sum(1 for d in p.due[:p.n] if d > 10), 20)
+        p.tick(12)
+        self.assertEqual(self.renders, 2)
+        self.assertEqual(sum(sum(v) for v in p.lattice), 20*6)
+        self.assertEqual(sum(sum(v) for v in self.ws), 20*6)
+
 
 def main():
     unittest.main()
@@ -2,7 +2,8 @@ import unittest
 import gc
 from ws2812 import WS2812
 from lights import Lights
-from ringramp import RingRamp
+from ringramp import RingRamp, Ball, BallStore, FixedBallStore
+import math
 
 # A helper
 def tg(led_count, start):
@@ -84,8 +85,288 @@ class RingRampTestCase(unittest.TestCase):
         for i in range(len(rr3)):
             self.assertEqual(tuple(ws[i+3]), tuple(v/10 for v in coloring[i]))
 
+    def test_RingRamp_balls(self):
+        # Balls are splatted, blurred, onto the arc of the ring there is
+        ws = WS2812(1, 12)
+        rr = RingRamp(leds=ws, circumference=16, bottom=3, blur=0.8)
+        rr.balls = [Ball(θ=0.3, color=(40, 0, 0)), Ball(θ=-2.0, color=(0, 60, 0)),
+                    Ball(θ=2.9, color=(0, 0, 80))]
+        rr.render()
+        ref = [[0, 0, 0] for i in range(12)]
+        for ball in rr.balls:
+            for i, c in rr.display_list_for_angle(ball.θ, ball.color, rr.blur):
+                k = (i + 3) % 16
+                if k < 12:
+                    for j in range(3):
+                        ref[k][j] += c[j]
+        for led, r in zip(ws, ref):
+            for v, rv in zip(led, r):
+                self.assertTrue(abs(v - rv) <= 1, (tuple(led), r))
+        self.assertTrue(sum(sum(led) for led in ws) > 100)
 
 
+class BallStoreTestCase(unittest.TestCase):
+    balls = [dict(θ=0.3, ω=1.0, color=(40, 0, 0)),
+             dict(θ=-2.0, ω=-0.5, Fd=0.02, color=(0, 60, 0)),
+             dict(θ=3.0, color=(0, 0, 80)),
+             dict(θ=2.5, ω=3.0, color=(1, 2, 3))]
+
+    def test_add_remove(self):
+        store = BallStore(capacity=2)
+        for kw in self.balls:
+            store.add(**kw)
+        self.assertEqual(len(store), 4)
+        self.assertTrue(store.capacity() >= 4)
+        # θ is kept in [-π, π)
+        store.add(θ=4.0)
+        self.assertTrue(abs(store.theta[4] - (4.0 - 2*math.pi)) < 1e-5)
+        store.remove(4)
+        self.assertEqual(store.color_of(2), (0, 0, 80))
+        store.remove(1)
+        self.assertEqual([store.color_of(i) for i in range(len(store))],
+                         [(40, 0, 0), (0, 0, 80), (1, 2, 3)])
+        with self.assertRaises(IndexError):
+            store.remove(3)
+
+    def test_integrate(self):
+        # The store integrates as Ball objects do
+        store = BallStore()
+        objs = []
+        for kw in self.balls:
+            store.add(**kw)
+            objs.append(Ball(**kw))
+        g_per_r = -40.0 / (60 / (2*math.pi))
+        for t in range(200):
+            store.integrate(0.01, g_per_r)
+            for ball in objs:
+                ball.integrate(0.01, a=g_per_r * math.sin(ball.θ))
+        for i, ball in enumerate(objs):
+            self.assertTrue(abs(store.theta[i] - ball.θ) < 1e-3,
+                            (store.theta[i], ball.θ))
+            self.assertTrue(abs(store.omega[i] - ball.ω) < 1e-3)
+
+    def test_check(self):
+        # check removes balls in place, and can add some
+        def check(balls, i, θ, ω):
+            if balls.colors[3*i] == 40:
+                balls.add(θ=0.0, color=(5, 5, 5))
+                return False
+            return balls.colors[3*i+2] != 80
+        store = BallStore(capacity=4, check=check)
+        for kw in self.balls:
+            store.add(**kw)
+        store.integrate(0.01)
+        self.assertEqual([store.color_of(i) for i in range(len(store))],
+                         [(0, 60, 0), (1, 2, 3), (5, 5, 5)])
+        self.assertEqual(store.theta[2], 0.0)
+
+    def test_render(self):
+        # A RingRamp renders a BallStore as it does a list of Ball
+        leds = [WS2812(1, 12), WS2812(1, 12)]
+        store = BallStore()
+        objs = []
+        for kw in self.balls:
+            store.add(**kw)
+            objs.append(Ball(**kw))
+        for balls, ws in zip((store, objs), leds):
+            rr = RingRamp(leds=ws, circumference=16, bottom=3, blur=0.8,
+                          balls=balls)
+            self.assertIs(rr.balls, balls)
+            rr.render()
+        self.assertEqual([tuple(led) for led in leds[0]],
+                         [tuple(led) for led in leds[1]])
+        self.assertTrue(sum(sum(led) for led in leds[0]) > 100)
+
+
+
+
+class FixedBallStoreTestCase(unittest.TestCase):
+    balls = BallStoreTestCase.balls + [dict(θ=-0.1, ω=8.0, Fd=0.005)]
+
+    def test_sines(self):
+        store = FixedBallStore(60)
+        self.assertEqual(len(store.sines), 60 * store.sine_steps)
+        self.assertEqual(store.sines[0], 0)
+        self.assertEqual(store.sines[15 * store.sine_steps], 16384)
+        self.assertEqual(store.sines[45 * store.sine_steps], -16384)
+
+    def test_add(self):
+        store = FixedBallStore(60)
+        for kw in self.balls:
+            store.add(**kw)
+        for i, kw in enumerate(self.balls):
+            θ = (kw['θ'] + math.pi) % (2*math.pi) - math.pi
+            self.assertTrue(abs(store.theta_of(i) - θ) < 1e-4)
+            self.assertTrue(abs(store.omega_of(i) - kw.get('ω', 0.0)) < 1e-4)
+
+    def test_trajectories(self):
+        # Fixed point follows the float integrator, close enough to
+        # land on the same pixel after seconds of swinging
+        circumference = 60
+        g = -40.0
+        r = circumference / (2*math.pi)
+        ppr = r
+        store = FixedBallStore(circumference)
+        objs = []
+        for kw in self.balls:
+            store.add(**kw)
+            objs.append(Ball(**kw))
+        worst = 0
+        for t in range(300):
+            store.integrate(0.01, g / r)
+            for ball in objs:
+                ball.integrate(0.01, a=g * math.sin(ball.θ) / r)
+            for i, ball in enumerate(objs):
+                d = (store.theta_of(i) - ball.θ + math.pi) % (2*math.pi) \
+                    - math.pi
+                worst = max(worst, abs(d) * ppr)
+        # In pixels
+        self.assertTrue(worst < 0.5, worst)
+        for i, ball in enumerate(objs):
+            self.assertTrue(abs(store.omega_of(i) - ball.ω) * ppr < 1.0,
+                            (store.omega_of(i), ball.ω))
+
+    def test_ringramp(self):
+        # A RingRamp can be asked for fixed point, and renders the same
+        leds = [WS2812(1, 12), WS2812(1, 12)]
+        rrs = [RingRamp(leds=ws, circumference=16, bottom=3, blur=0.8,
+                        g=-10.0, fixed_point=fixed)
+               for ws, fixed in zip(leds, (True, False))]
+        self.assertTrue(isinstance(rrs[0].balls, FixedBallStore))
+        self.assertEqual(rrs[1].balls, [])
+        for kw in self.balls[:4]:
+            rrs[0].balls.add(**kw)
+            rrs[1].balls.append(Ball(**kw))
+        for rr in rrs:
+            rr.integrate(0.01)
+            rr.render()
+        for a, b in zip(leds[0], leds[1]):
+            for u, v in zip(a, b):
+                self.assertTrue(abs(u - v) <= 1, (tuple(a), tuple(b)))
+
+
+class BallTrackingTestCase(unittest.TestCase):
+    # The pixel index, gates and collisions, for both kinds of store
+    c = 60
+
+    def stores(self, **kw):
+        return [BallStore(circumference=self.c, **kw),
+                FixedBallStore(self.c, **kw)]
+
+    def px(self, p):
+        # The angle of the middle of pixel p
+        return (p + 0.5) * 2*math.pi / self.c
+
+    def test_index(self):
+        for store in self.stores(capacity=2):
+            for p in (3, 3, 17, -2, 3):
+                store.add(θ=self.px(p))
+            self.assertEqual(list(store.pixel[:5]), [3, 3, 17, 58, 3])
+            self.assertEqual(sorted(store.in_pixel(3)), [0, 1, 4])
+            self.assertEqual(list(store.in_pixel(-2)), [3])
+            self.assertEqual(list(store.in_pixel(4)), [])
+            store.remove(1)
+            self.assertEqual(sorted(store.in_pixel(3)), [0, 3])
+            self.assertEqual(list(store.in_pixel(17)), [1])
+            # Moving balls are indexed where they get to
+            store.remove(1)
+            store.add(θ=self.px(17), ω=2*math.pi / self.c / 0.01, Fd=0.0)
+            store.integrate(0.01)
+            self.assertEqual(list(store.in_pixel(18)), [3])
+            self.assertEqual(list(store.in_pixel(17)), [])
+
+    def test_tracks_existing(self):
+        # A store given to a RingRamp tracks its ring from then on
+        store = BallStore()
+        store.add(θ=self.px(5))
+        rr = RingRamp(leds=WS2812(1, 8), circumference=self.c, balls=store)
+        self.assertEqual(list(store.in_pixel(5)), [0])
+
+    def test_gates(self):
+        for store in self.stores():
+            crossed = []
+            def gate(balls, i, direction):
+                crossed.append((balls.color_of(i), direction))
+                return balls.color_of(i) != (0, 0, 9)
+            store.add_gate(self.px(10) - math.pi / self.c, gate) # 10/11
+            store.add(θ=self.px(9), ω=3.0, color=(0, 0, 1))
+            store.add(θ=self.px(11), ω=-3.0, color=(0, 0, 2))
+            store.add(θ=self.px(20), ω=3.0, color=(0, 0, 3))
+            store.add(θ=self.px(8), ω=5.0, color=(0, 0, 9))
+            for t in range(20):
+                store.integrate(0.01)
+            self.assertEqual(sorted(crossed),
+                             [((0, 0, 1), 1), ((0, 0, 2), -1),
+                              ((0, 0, 9), 1)])
+            # The gate took the last ball out
+            self.assertEqual([store.color_of(i) for i in range(len(store))],
+                             [(0, 0, 1), (0, 0, 2), (0, 0, 3)])
+
+    def test_gate_wraps(self):
+        # Gates work across θ = ±π too
+        for store in self.stores():
+            crossed = []
+            store.add_gate(math.pi, lambda b, i, d: crossed.append(d) or True)
+            store.add(θ=math.pi - 0.05, ω=10.0)
+            for t in range(10):
+                store.integrate(0.01)
+            self.assertEqual(crossed, [1])
+
+    def test_collide(self):
+        for store in self.stores():
+            store.add(θ=self.px(20), ω=1.0, color=(1, 0, 0))
+            store.add(θ=self.px(20) + 0.05, ω=-1.0, color=(2, 0, 0))
+            store.add(θ=self.px(40), ω=1.0, color=(3, 0, 0))
+            store.add(θ=self.px(40) + 0.5, ω=-1.0, color=(4, 0, 0))
+            store.integrate(0)
+            ω = [store.omega[i] for i in range(4)]
+            store.collide(1.0)
+            # Only the close pair, which is closing, bounces
+            self.assertEqual([store.omega[i] for i in range(4)],
+                             [ω[1], ω[0], ω[2], ω[3]])
+            # They are then parting, so don't bounce back
+            store.collide(1.0)
+            self.assertEqual([store.omega[i] for i in range(4)],
+                             [ω[1], ω[0], ω[2], ω[3]])
+
+    def test_collide_across_pixels(self):
+        for store in self.stores():
+            store.add(θ=self.px(30) - 0.01, ω=-0.5)
+            store.add(θ=self.px(29) + 0.02, ω=0.0)
+            self.assertNotEqual(store.pixel[0], store.pixel[1])
+            store.integrate(0)
+            store.collide(1.0)
+            self.assertEqual(store.omega[0], 0)
+            self.assertTrue(store.omega[1] < 0)
+
+    def test_collide_head_on(self):
+        # Two balls meeting head-on each turn back, whether they meet in
+        # one pixel or across two, on a ring of two pixels or more
+        for c in (2, 3, 60):
+            for θ0, θ1 in ((0.2, 0.3), (math.pi - 0.05, math.pi + 0.05)):
+                for store in (BallStore(circumference=c),
+                              FixedBallStore(c)):
+                    store.add(θ=θ0, ω=1.0, Fd=0.0)
+                    store.add(θ=θ1, ω=-1.0, Fd=0.0)
+                    store.integrate(0)
+                    store.collide(1.0)
+                    self.assertTrue(store.omega[0] < 0 < store.omega[1],
+                                    (c, θ0, store.omega[0], store.omega[1]))
+                    store.collide(1.0)
+                    self.assertTrue(store.omega[0] < 0 < store.omega[1])
+
+    def test_ringramp_collisions(self):
+        # Balls on a RingRamp don't pass through each other
+        rr = RingRamp(leds=WS2812(1, 8), circumference=self.c, g=0.0,
+                      balls=BallStore(), collide_within=0.5)
+        balls = rr.balls
+        balls.add(θ=self.px(10), ω=2.0, Fd=0.0)
+        balls.add(θ=self.px(14), ω=-2.0, Fd=0.0)
+        for t in range(50):
+            rr.integrate(0.01)
+        self.assertTrue(balls.theta[0] < balls.theta[1])
+        self.assertTrue(balls.omega[0] < 0 < balls.omega[1])
+
 
 def main():
     unittest.main()
@@ -9,8 +9,15 @@ import math
 
 import random
 from sys import platform
+from array import array
 
-from ws2812 import WS2812, Pixel, PREALLOCATE, CACHE, RECREATE
+from ws2812 import WS2812, WS2812Stream, Pixel, PREALLOCATE, CACHE, RECREATE, \
+    CURSOR
+
+if platform == 'pyboard':
+    from ws2812_helper_pyb import _set_rgb_values, _set_rgb_values_shift
+else:
+    from ws2812_helper_sim import _set_rgb_values, _set_rgb_values_shift
 
 #log = logging.getLogger("test_ws2812")
 
@@ -46,7 +53,8 @@ def vg():
 
 class WS2812TestCase(unittest.TestCase):
     names = """SinglePixel PixelBufferBits GrindSinglePixel PixelAssignPixel
-MultiPixel MultiPixelFedIterator SlicedRval SlicedLval""".split()
+MultiPixel MultiPixelFedIterator MultiPixelFedFlat SlicedRval SlicedLval
+Intensity ReadInto Shadow Compact Iter Bulk Gamma""".split()
     #names = ['SlicedRval']  # DEBUG
 
     def setUp(self):
@@ -60,7 +68,7 @@ MultiPixel MultiPixelFedIterator SlicedRval SlicedLval""".split()
     #@unittest.skip("x")
     def testAllMemoryStrategies(self):
         print()
-        for mem in (PREALLOCATE, CACHE, RECREATE):
+        for mem in (PREALLOCATE, CACHE, RECREATE, CURSOR):
             for name in self.names:
                 fun = getattr(self, 'doTest'+name)
                 print("\tdoTest%s(mem=%d) ... " % (name, mem), end='')
@@ -130,23 +138,16 @@ MultiPixel MultiPixelFedIterator SlicedRval SlicedLval""".split()
     def doTestPixelBufferBits(self, mem):
         leds = WS2812(spi_bus=1, led_count=1, mem=mem)
 
-        if platform == 'pyboard':
-            plati = 0
-        else:
-            plati = 1
-
         # As-created the pixels are all off
         # Off is represented correctly in the buffer
         self.assertEqual('|'.join('%x' % v for v in leds.buf),
-                         ('11|11|11|11|11|11|11|11|11|11|11|11|0',
-                          '0|0|0|0|0|0|0|0|0|0|0|0|0')[plati])
+                         '11|11|11|11|11|11|11|11|11|11|11|11|0')
 
         # All-ones is represented correctly in the buffer
         leds[0] = b'\xff\xff\xff'
         self.assertEqual(list(leds[0]), [255, 255, 255])
         self.assertEqual('|'.join('%x' % v for v in leds.buf),
-                         ('33|33|33|33|33|33|33|33|33|33|33|33|0',
-                          'ff|ff|ff|0|0|0|0|0|0|0|0|0|0')[plati])
+                         '33|33|33|33|33|33|33|33|33|33|33|33|0')
 
         pix = leds[0]
         # The colors are in the right place, affecting the correct bits in the buffer
@@ -154,24 +155,21 @@ MultiPixel MultiPixelFedIterator SlicedRval SlicedLval""".split()
         pix[1] = 1
         pix[2] = 4
         self.assertEqual('|'.join('%x' % v for v in leds.buf),
-                         ('11|11|11|13|11|11|11|31|11|11|13|11|0',
-                          '1|2|4|0|0|0|0|0|0|0|0|0|0')[plati])
+                         '11|11|11|13|11|11|11|31|11|11|13|11|0')
         # variation
         pix[0] = 12
         pix[1] = 34
         pix[2] = 56
         self.assertEqual(list(leds[0]), [12, 34, 56])
         self.assertEqual('|'.join('%x' % v for v in leds.buf),
-                         ('11|31|11|31|11|11|33|11|11|33|31|11|0',
-                          '22|c|38|0|0|0|0|0|0|0|0|0|0')[plati])
+                         '11|31|11|31|11|11|33|11|11|33|31|11|0')
         # variation
         pix[0] = -1
         pix[1] = 345
         pix[2] = 777777777
         self.assertEqual(list(leds[0]), [255, 89, 113])
         self.assertEqual('|'.join('%x' % v for v in leds.buf),
-                         ('13|13|31|13|33|33|33|33|13|33|11|13|0',
-                          '59|ff|71|0|0|0|0|0|0|0|0|0|0')[plati])
+                         '13|13|31|13|33|33|33|33|13|33|11|13|0')
 
 
     def testMemoryUsed0(self):
@@ -300,6 +298,219 @@ MultiPixel MultiPixelFedIterator SlicedRval SlicedLval""".split()
         if platform == 'pyboard':
             self.assertEqual(delta_mem, 0)
 
+    #@unittest.skip("FIXME")
+    def testMemoryUsed12(self):
+        leds = WS2812(spi_bus=1, led_count=64, mem=PREALLOCATE)
+        flat = bytearray(range(24))
+        prev_mem_free = gc.mem_free()
+        for i in range(8):
+            leds[i:i+8] = flat      # no leak
+            leds[i:i+16:2] = flat   # no leak
+        delta_mem = gc.mem_free() - prev_mem_free
+        if platform == 'pyboard':
+            self.assertEqual(delta_mem, 0)
+
+    #@unittest.skip("FIXME")
+    def testMemoryUsed13(self):
+        leds = WS2812(spi_bus=1, led_count=64, mem=PREALLOCATE)
+        rgbs = [bytearray((i, 2*i, 3*i)) for i in range(8)]
+        prev_mem_free = gc.mem_free()
+        for i in range(8):
+            leds[-i-1:-i-9:-1] = rgbs # no leak
+        delta_mem = gc.mem_free() - prev_mem_free
+        if platform == 'pyboard':
+            self.assertEqual(delta_mem, 0)
+
+    def testEncodeSpeed(self):
+        # Benchmark of per-pixel set with the encode table against the
+        # shift-based encoder it replaced
+        leds = WS2812(spi_bus=1, led_count=64)
+        buf = leds.buf
+        table = leds.table
+        v = bytearray((12, 34, 56))
+        n = 1000
+        t0 = pyb.micros()
+        for i in range(n):
+            _set_rgb_values_shift(buf, i & 63, v)
+        dt_shift = pyb.elapsed_micros(t0)
+        ref = bytes(buf)
+        t0 = pyb.micros()
+        for i in range(n):
+            _set_rgb_values(buf, i & 63, v, table)
+        dt_table = pyb.elapsed_micros(t0)
+        self.assertEqual(bytes(buf), ref)
+        print("per-pixel set: shift %f us, table %f us" % \
+              (dt_shift / n, dt_table / n), end=' ')
+
+    def testDoubleBuffer(self):
+        # A double-buffered chain sends from its front buffer while the
+        # next frame is drawn
+        if platform != 'pyboard':
+            # For present() to be seen to return before the send is done
+            pyb.SPI.wire_time = True
+        try:
+            n = 200
+            leds = WS2812(spi_bus=1, led_count=n, double_buffer=True)
+            self.assertEqual(len(leds.front), len(leds.buf))
+            leds.fill_buf(tg(n, 1))
+            frame1 = bytes(leds.buf)
+            t0 = pyb.micros()
+            leds.present()
+            dt_present = pyb.elapsed_micros(t0)
+            self.assertEqual(bytes(leds.front), frame1)
+
+            # Drawing the next frame doesn't disturb the one being sent
+            leds.fill_buf(tg(n, 2))
+            self.assertEqual(bytes(leds.front), frame1)
+            self.assertNotEqual(bytes(leds.buf), frame1)
+            leds.wait()
+            self.assertFalse(leds.busy())
+            leds.present()
+            self.assertEqual(leds.front, leds.buf)
+
+            if platform != 'pyboard':
+                # The mock SPI takes wire time, which present() doesn't wait for
+                wire_us = leds.spi.wire_micros(len(leds.buf))
+                print("present %d us, wire %d us" % (dt_present, wire_us), end=' ')
+                self.assertTrue(dt_present < wire_us)
+                self.assertTrue(leds.busy())
+            leds.wait()
+        finally:
+            if platform != 'pyboard':
+                pyb.SPI.wire_time = False
+
+        # A single-buffered chain can't present()
+        leds = WS2812(spi_bus=1, led_count=n)
+        self.assertIsNone(leds.front)
+        with self.assertRaises(ValueError):
+            leds.present()
+
+    def testDirty(self):
+        # sync() sends only as far as the last changed LED, and nothing
+        # if nothing changed
+        class SendCounter:
+            def __init__(self):
+                self.sent = []
+            def send(self, data):
+                self.sent.append(len(data))
+
+        leds = WS2812(spi_bus=1, led_count=10)
+        leds.spi = spi = SendCounter()
+        leds.sync()
+        self.assertEqual(spi.sent, [])
+
+        leds[2] = (1, 2, 3)
+        self.assertEqual(leds.dirty_to, 3)
+        leds.sync()
+        self.assertEqual(spi.sent, [12*3 + 1])
+        self.assertEqual(leds.dirty_to, 0)
+        leds.sync()
+        self.assertEqual(spi.sent, [12*3 + 1])
+
+        # Pixel setters count as changes
+        leds[-1].g = 7
+        self.assertEqual(leds.dirty_to, 10)
+        leds.sync()
+        self.assertEqual(spi.sent[-1], len(leds.buf))
+        leds[4][2] = 7
+        self.assertEqual(leds.dirty_to, 5)
+
+        # A short explicit sync leaves the rest to be sent
+        leds.sync(2)
+        self.assertEqual(spi.sent[-1], 12*2 + 1)
+        self.assertEqual(leds.dirty_to, 5)
+        leds.sync(6)
+        self.assertEqual(leds.dirty_to, 0)
+
+        # As do bulk updates
+        leds.update_buf(b'foobar', 3)
+        self.assertEqual(leds.dirty_to, 5)
+        leds.sync()
+        leds.update_buf([b'foo'])
+        self.assertEqual(leds.dirty_to, 1)
+        leds.fill_buf([])
+        self.assertEqual(leds.dirty_to, 10)
+        leds.send_buf()
+        self.assertEqual(leds.dirty_to, 0)
+        leds[0:2] = [b'foo', b'bar']
+        self.assertEqual(leds.dirty_to, 2)
+
+        # And changes can be noted by hand
+        leds.touch(7)
+        self.assertEqual(leds.dirty_to, 7)
+        leds.touch()
+        self.assertEqual(leds.dirty_to, 10)
+
+    def testStream(self):
+        # A streamed chain sends in chunks what a whole chain would
+        class Recorder:
+            def __init__(self):
+                self.sent = []
+            def send(self, data):
+                self.sent.append(bytes(data))
+
+        n = 100
+        for spi_bits in (4, 3):
+            width = 3*spi_bits
+            leds = WS2812Stream(spi_bus=1, led_count=n, chunk=16,
+                                spi_bits=spi_bits, intensity=0.5)
+            self.assertEqual([len(b) for b in leds.bufs], [16*width + 1] * 2)
+            ref = WS2812(spi_bus=1, led_count=n, spi_bits=spi_bits,
+                         intensity=0.5)
+            ref.fill_buf(tg(70, 1))
+            for data in (tg(70, 1),
+                         [bytearray(t) for t in tg(70, 1)],
+                         bytes(v for t in tg(70, 1) for v in t)):
+                leds.spi = spi = Recorder()
+                leds._send_nowait = spi.send
+                leds.show(data)
+                self.assertEqual([len(b) for b in spi.sent],
+                                 [16*width + 1] * 6 + [4*width + 1])
+                # Each chunk ends low
+                self.assertEqual([b[-1] for b in spi.sent], [0] * 7)
+                self.assertEqual(b''.join(b[:-1] for b in spi.sent) + b'\0',
+                                 bytes(ref.buf))
+
+            # More data than LEDs is cut short
+            leds.show(tg(n + 10, 1))
+            self.assertEqual(len(spi.sent), 7 + 7)
+
+    def testCompactSizes(self):
+        # Buffer size and time on the wire of the compact encoding
+        # against the 4-bit one
+        n = 1000
+        for spi_bits in (4, 3):
+            leds = None
+            gc.collect()
+            leds = WS2812(spi_bus=1, led_count=n, spi_bits=spi_bits)
+            self.assertEqual(len(leds.buf), 3*spi_bits*n + 1)
+            if platform != 'pyboard':
+                wire_us = leds.spi.wire_micros(len(leds.buf))
+                print("%d-bit: %d bytes, %d us on the wire" % \
+                      (spi_bits, len(leds.buf), wire_us), end=' ')
+
+    def testHeapUse(self):
+        # Heap taken by a chain, and by going over all its pixels, for
+        # each memory strategy
+        for n in (60, 240, 1000):
+            print()
+            for mem in (PREALLOCATE, CACHE, RECREATE, CURSOR):
+                leds = None
+                gc.collect()
+                m0 = gc.mem_free()
+                leds = WS2812(spi_bus=1, led_count=n, mem=mem)
+                gc.collect()
+                m1 = gc.mem_free()
+                for p in leds:
+                    p.r = 1
+                m2 = gc.mem_free()
+                gc.collect()
+                m3 = gc.mem_free()
+                print("%d LEDs, mem=%d: %d bytes, loop %d bytes (%d kept)" % \
+                      (n, mem, m0 - m1, m1 - m2, m1 - m3), end=' ')
+                if platform == 'pyboard' and mem == CURSOR:
+                    self.assertEqual(m1 - m3, 0)
+
     def testSizes(self):
         gc.collect()
         m0 = gc.mem_free()
@@ -309,6 +520,271 @@ MultiPixel MultiPixelFedIterator SlicedRval SlicedLval""".split()
         print((m1-m0)/256)
 
 
+    def doTestIntensity(self, mem):
+        # Intensity scales values as they are encoded
+        leds = WS2812(spi_bus=1, led_count=3, intensity=0.5, mem=mem)
+        other = WS2812(spi_bus=1, led_count=3, mem=mem)
+        self.assertEqual(leds.intensity, 0.5)
+        self.assertIsNot(leds.table, other.table)
+        leds[0] = (200, 100, 51)
+        leds[1].r = 255
+        leds.update_buf(b'\x02\x04\x06', 2)
+        self.assertEqual([tuple(led) for led in leds],
+                         [(100, 50, 26), (128, 0, 0), (1, 2, 3)])
+
+        # Changing intensity rebuilds the same table in place
+        table = leds.table
+        leds.intensity = 0.25
+        self.assertIs(leds.table, table)
+        leds[0] = (200, 100, 51)
+        self.assertEqual(tuple(leds[0]), (50, 25, 13))
+
+        # Intensity 0 is dark
+        leds.intensity = 0
+        leds[0] = (200, 100, 51)
+        self.assertEqual(tuple(leds[0]), (0, 0, 0))
+
+        # Full intensity shares the one table
+        leds.intensity = 1
+        self.assertIs(leds.table, other.table)
+        leds[0] = (200, 100, 51)
+        self.assertEqual(tuple(leds[0]), (200, 100, 51))
+
+    def doTestGamma(self, mem):
+        # Gamma is applied as values are encoded, before intensity
+        def g(v, gamma, intensity=1):
+            return round(intensity * round(255 * (v / 255) ** gamma))
+        for spi_bits in (4, 3):
+            leds = WS2812(spi_bus=1, led_count=3, mem=mem, gamma=2.2,
+                          spi_bits=spi_bits)
+            other = WS2812(spi_bus=1, led_count=3, mem=mem,
+                           spi_bits=spi_bits)
+            self.assertEqual(leds.gamma, 2.2)
+            self.assertIsNot(leds.table, other.table)
+            leds[0] = (0, 128, 255)
+            self.assertEqual(tuple(leds[0]), (0, g(128, 2.2), 255))
+            self.assertTrue(g(128, 2.2) < 64)
+
+            # With intensity too, from the same table
+            table = leds.table
+            leds.intensity = 0.5
+            self.assertIs(leds.table, table)
+            leds[0] = (0, 128, 255)
+            self.assertEqual(tuple(leds[0]),
+                             (0, g(128, 2.2, 0.5), g(255, 2.2, 0.5)))
+
+            # Gamma 1 at full intensity shares the one table again
+            leds.gamma = 1
+            leds.intensity = 1
+            self.assertIs(leds.table, other.table)
+            leds[1:3] = b'\x00\x80\xff\x10\x20\x30'
+            self.assertEqual([tuple(led) for led in leds[1:]],
+                             [(0, 128, 255), (16, 32, 48)])
+
+
+    def doTestReadInto(self, mem):
+        # A chain can be read back in bulk into flat RGB
+        for n in range(1, 200, 19):
+            leds = None
+            gc.collect()
+            leds = WS2812(spi_bus=1, led_count=n, mem=mem)
+            leds.fill_buf(tg(n, 1))
+            flat = bytearray(v for t in tg(n, 1) for v in t)
+            rgb = bytearray(3*n)
+            self.assertEqual(leds.read_into(rgb), n)
+            self.assertEqual(rgb, flat)
+
+        # A part can be read
+        rgb = bytearray(b'-' * 9)
+        self.assertEqual(leds.read_into(rgb, 2, 4), 2)
+        self.assertEqual(rgb, flat[6:12] + b'---')
+        self.assertEqual(leds.read_into(rgb, n-1, n+5), 1)
+        self.assertEqual(rgb[:3], flat[-3:])
+        self.assertEqual(leds.read_into(rgb, 4, 4), 0)
+
+        # Into an array too
+        rgb = array('B', range(6))
+        leds.read_into(rgb, 1, 3)
+        self.assertEqual(bytes(rgb), flat[3:9])
+
+        # dest must be big enough
+        with self.assertRaises(IndexError):
+            leds.read_into(bytearray(5), 0, 2)
+
+    def doTestIter(self, mem):
+        # A chain iterates over its pixels, and over its values
+        for spi_bits in (4, 3):
+            for shadow in (False, True):
+                n = 23
+                leds = WS2812(spi_bus=1, led_count=n, mem=mem,
+                              spi_bits=spi_bits, shadow=shadow)
+                leds.fill_buf(tg(n, 1))
+                expect = [tuple(t) for t in tg(n, 1)]
+                self.assertEqual([tuple(p) for p in leds], expect)
+                self.assertEqual([tuple(leds[i]) for i in range(n)], expect)
+                self.assertEqual([tuple(v) for v in leds.iter_rgb()], expect)
+
+                # The values come in one reused bytearray
+                vs = list(leds.iter_rgb())
+                self.assertTrue(all(v is vs[0] for v in vs))
+
+                # Pixels got by iterating work
+                for k, p in enumerate(leds):
+                    p.g = k
+                self.assertEqual([p.g for p in leds], list(range(n)))
+
+    def doTestBulk(self, mem):
+        # Fills, tiles and gradients set the same as pixel by pixel
+        n = 41
+        for spi_bits in (4, 3):
+            for shadow in (False, True):
+                leds = WS2812(spi_bus=1, led_count=n, mem=mem,
+                              spi_bits=spi_bits, shadow=shadow)
+                ref = WS2812(spi_bus=1, led_count=n, mem=mem,
+                             spi_bits=spi_bits)
+                leds.sync()
+
+                leds.fill((1, 2, 3), 5, 30)
+                self.assertEqual(leds.dirty_to, 0 if shadow else 30)
+                for i in range(5, 30):
+                    ref[i] = (1, 2, 3)
+                self.assertEqual([tuple(p) for p in leds],
+                                 [tuple(p) for p in ref])
+                leds.fill(b'\x09\x08\x07')
+                ref.fill_buf([(9, 8, 7)] * n)
+                self.assertEqual([tuple(p) for p in leds],
+                                 [tuple(p) for p in ref])
+
+                pattern = [(10, 0, 0), (0, 20, 0), (0, 0, 30)]
+                leds.tile(pattern, 3, 36)
+                for i in range(3, 36):
+                    ref[i] = pattern[(i - 3) % 3]
+                self.assertEqual([tuple(p) for p in leds],
+                                 [tuple(p) for p in ref])
+                leds.tile(b'\x01\x02\x03\x04\x05\x06', 37)
+                ref[37:] = [(1, 2, 3), (4, 5, 6)] * 2
+                self.assertEqual([tuple(p) for p in leds],
+                                 [tuple(p) for p in ref])
+
+                leds.gradient((0, 100, 255), (255, 0, 5), 1, 40)
+                for k in range(39):
+                    ref[1 + k] = (round(255*k/38), round(100 - 100*k/38),
+                                  round(255 - 250*k/38))
+                got = [tuple(p) for p in leds]
+                want = [tuple(p) for p in ref]
+                self.assertEqual(got[0], want[0])
+                self.assertEqual(got[40], want[40])
+                self.assertEqual(got[1], (0, 100, 255))
+                self.assertEqual(got[39], (255, 0, 5))
+                for g, w in zip(got, want):
+                    for a, b in zip(g, w):
+                        self.assertTrue(abs(a - b) <= 1)
+
+                # Nothing happens to an empty span
+                leds.fill((1, 1, 1), 10, 10)
+                leds.tile(pattern, n, n + 5)
+                leds.gradient((1, 1, 1), (2, 2, 2), 20, 3)
+                self.assertEqual(got, [tuple(p) for p in leds])
+                if shadow:
+                    leds.sync()
+                    ref.show(got)
+                    self.assertEqual(leds.buf, ref.buf)
+
+    def doTestCompact(self, mem):
+        # The compact encoding takes 3 bits per data bit
+        leds = WS2812(spi_bus=1, led_count=1, mem=mem, spi_bits=3)
+        self.assertEqual('|'.join('%x' % v for v in leds.buf),
+                         '24|92|49|24|92|49|24|92|49|0')
+        leds[0] = b'\xff\xff\xff'
+        self.assertEqual('|'.join('%x' % v for v in leds.buf),
+                         '6d|b6|db|6d|b6|db|6d|b6|db|0')
+        pix = leds[0]
+        pix[0] = 2
+        pix[1] = 1
+        pix[2] = 0x80
+        self.assertEqual(list(leds[0]), [2, 1, 0x80])
+        self.assertEqual('|'.join('%x' % v for v in leds.buf),
+                         '24|92|4b|24|92|59|64|92|49|0')
+
+        # Otherwise it works as the 4-bit one does
+        n = 37
+        leds = WS2812(spi_bus=1, led_count=n, mem=mem, spi_bits=3,
+                      intensity=0.5)
+        ref = WS2812(spi_bus=1, led_count=n, mem=mem, intensity=0.5)
+        for chain in (leds, ref):
+            chain.fill_buf(tg(n-2, 1))
+            chain[3] = (255, 128, 1)
+            chain[4].r = 77
+            chain[5][2] = 200
+            chain[6:8] = [(1, 2, 3), b'\x04\x05\x06']
+            chain.update_buf(b'\x10\x20\x30', 20)
+        self.assertEqual([tuple(led) for led in leds],
+                         [tuple(led) for led in ref])
+        self.assertEqual(leds.get_led_values(4), ref.get_led_values(4))
+        rgb, ref_rgb = bytearray(3*n), bytearray(3*n)
+        leds.read_into(rgb)
+        ref.read_into(ref_rgb)
+        self.assertEqual(rgb, ref_rgb)
+
+        leds.sync()
+        leds[1] = (1, 1, 1)
+        self.assertEqual(leds.dirty_to, 2)
+
+        with self.assertRaises(ValueError):
+            WS2812(spi_bus=1, led_count=n, spi_bits=2)
+
+    def doTestShadow(self, mem):
+        # A shadowed chain reads back what was written, and encodes it
+        # only when sent
+        n = 17
+        leds = None
+        gc.collect()
+        leds = WS2812(spi_bus=1, led_count=n, mem=mem, intensity=0.5,
+                      shadow=True)
+        ref = WS2812(spi_bus=1, led_count=n, mem=mem, intensity=0.5)
+        blank = bytes(leds.buf)
+
+        leds.fill_buf(tg(n, 1))
+        leds[3] = (255, 128, 1)
+        leds[4].r = 77
+        leds[5][2] = 200
+        leds[6:8] = [(1, 2, 3), b'\x04\x05\x06']
+        ref.fill_buf(tg(n, 1))
+        ref[3] = (255, 128, 1)
+        ref[4].r = 77
+        ref[5][2] = 200
+        ref[6:8] = [(1, 2, 3), b'\x04\x05\x06']
+
+        # Reads are not scaled by the intensity
+        self.assertEqual(tuple(leds[3]), (255, 128, 1))
+        self.assertEqual(leds[4].r, 77)
+        self.assertEqual(leds[5].b, 200)
+        self.assertEqual(tuple(leds.get_led_values(-10)), (4, 5, 6))
+        rgb = bytearray(3*n)
+        leds.read_into(rgb)
+        self.assertEqual(rgb[9:12], bytearray((255, 128, 1)))
+
+        # Nothing is encoded until sent, then it is as if unshadowed
+        self.assertEqual(bytes(leds.buf), blank)
+        leds.sync()
+        self.assertEqual(leds.buf, ref.buf)
+
+        # A new intensity re-encodes everything
+        leds.intensity = ref.intensity = 0.25
+        leds.sync()
+        ref.fill_buf(tg(n, 1))
+        ref[3] = (255, 128, 1)
+        ref[4].r = 77
+        ref[5][2] = 200
+        ref[6:8] = [(1, 2, 3), b'\x04\x05\x06']
+        self.assertEqual(leds.buf, ref.buf)
+        self.assertEqual(tuple(leds[3]), (255, 128, 1))
+
+        # Filling short clears the rest
+        leds.fill_buf(tg(2, 1))
+        self.assertEqual(tuple(leds[5]), (0, 0, 0))
+
+
     #@unittest.skip("x")
     def doTestGrindSinglePixel(self, mem):
         # get / set work as expected
@@ -334,9 +810,13 @@ MultiPixel MultiPixelFedIterator SlicedRval SlicedLval""".split()
         self.assertEqual(list(leds[0]), [2, 4, 6])
         self.assertEqual(list(leds[1]), [19, 23, 29])
         self.assertEqual(list(leds[2]), [1, 2, 3])
-        self.assertIsNot(leds[0], leds[1])
-        self.assertIsNot(leds[0], leds[2])
-        self.assertIsNot(leds[1], leds[2])
+        if mem == CURSOR:
+            # There is just the one Pixel
+            self.assertIs(leds[0], leds[1])
+        else:
+            self.assertIsNot(leds[0], leds[1])
+            self.assertIsNot(leds[0], leds[2])
+            self.assertIsNot(leds[1], leds[2])
 
 
     #@unittest.skip("x")
@@ -376,6 +856,58 @@ MultiPixel MultiPixelFedIterator SlicedRval SlicedLval""".split()
                 self.assertEqual(list(pix), list(pg))
 
 
+    def doTestMultiPixelFedFlat(self, mem):
+        # A chain can be fed from flat RGB data in one call
+        for n in range(1, 200, 19):
+            leds = None
+            gc.collect()
+            leds = WS2812(spi_bus=1, led_count=n, mem=mem)
+            flat = bytearray(v for t in tg(n, 1) for v in t)
+            for data in (flat, bytes(flat), array('B', flat)):
+                leds.fill_buf(tg(n, 0))
+                self.assertEqual(leds.update_buf(data), n)
+                for pix, pg in zip(leds, tg(n, 1)):
+                    self.assertEqual(list(pix), list(pg))
+
+            # Gives the same encoding as setting pixel-by-pixel
+            ref = WS2812(spi_bus=1, led_count=n, mem=mem)
+            ref.fill_buf(tg(n, 1))
+            self.assertEqual(leds.buf, ref.buf)
+
+        # Can start part way, leaving the rest alone
+        leds = WS2812(spi_bus=1, led_count=5, mem=mem)
+        leds.fill_buf(tg(5, 0))
+        self.assertEqual(leds.update_buf(b'foobar', 2), 4)
+        self.assertEqual([tuple(led) for led in leds],
+                         [(0,1,2), (3,4,5), tuple(b'foo'), tuple(b'bar'), (12,13,14)])
+
+        # fill_buf turns off the LEDs after the data
+        leds.fill_buf(b'foo')
+        self.assertEqual([tuple(led) for led in leds],
+                         [tuple(b'foo')] + [(0,0,0)]*4)
+
+        # Only arrays of bytes are flat data. Others go item by item,
+        # where a number isn't a color (MicroPython's arrays don't say
+        # what they hold)
+        if hasattr(array('B'), 'typecode'):
+            for data in (array('h', (300, 1, 2, 3, 4, 5)),
+                         array('f', (1, 2, 3, 4, 5, 6)),
+                         memoryview(array('h', (1, 2, 3)))):
+                with self.assertRaises(TypeError):
+                    leds[0:2] = data
+                with self.assertRaises(TypeError):
+                    leds.update_buf(data)
+            leds[0:2] = [array('h', (7, 8, 9)), array('B', (1, 2, 3))]
+            self.assertEqual([tuple(led) for led in leds[0:2]],
+                             [(7, 8, 9), (1, 2, 3)])
+
+        # Can't run off the end
+        with self.assertRaises(IndexError):
+            leds.update_buf(bytes(3*6))
+        with self.assertRaises(IndexError):
+            leds.update_buf(b'foobar', 4)
+
+
     def doTestSlicedRval(self, mem):
         # A chain slice can be read
         leds = WS2812(spi_bus=1, led_count=9, mem=mem)
@@ -425,6 +957,43 @@ MultiPixel MultiPixelFedIterator SlicedRval SlicedLval""".split()
             k = i + 6
             self.assertEqual(tuple(leds[k]), (i, 2*i, 3*i))
 
+        # Slices with steps work as they do for lists
+        ref = [(0, 0, 0)] * len(leds)
+        for index in (slice(None, None, 2), slice(1, None, 3),
+                      slice(None, None, -1), slice(-2, 1, -2),
+                      slice(7, 2), slice(-20, 20), slice(5, None, -3)):
+            leds.fill_buf([])
+            leds.sync()
+            ref = [(0, 0, 0)] * len(leds)
+            values = [(i, 2*i, 3*i) for i in range(1, 8)]
+            dests = range(len(leds))[index][:len(values)]
+            for i, v in zip(dests, values):
+                ref[i] = v
+            leds[index] = values
+            self.assertEqual([tuple(led) for led in leds], ref)
+            self.assertEqual(leds.dirty_to, max(dests) + 1 if dests else 0)
+            if dests:
+                self.assertEqual([tuple(led) for led in leds[index]],
+                                 ref[index])
+
+            # Flat data too
+            leds.fill_buf([])
+            leds[index] = bytes(v for t in values for v in t)
+            self.assertEqual([tuple(led) for led in leds], ref)
+
+            # And with a shadow
+            shadowed = WS2812(spi_bus=1, led_count=9, mem=mem, shadow=True)
+            shadowed[index] = values
+            self.assertEqual([tuple(led) for led in shadowed], ref)
+            shadowed.fill_buf([])
+            shadowed[index] = bytes(v for t in values for v in t)
+            self.assertEqual([tuple(led) for led in shadowed], ref)
+            shadowed.sync()
+            self.assertEqual([tuple(led) for led in leds], ref)
+
+        with self.assertRaises(ValueError):
+            leds[::0] = values
+
 
 
 def main():
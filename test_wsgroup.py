@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import pyb
+from sys import platform
+
+from ws2812 import WS2812
+from wsgroup import WSGroup
+
+
+def flat(leds):
+    return [tuple(p) for p in leds]
+
+
+class WSGroupTestCase(unittest.TestCase):
+
+    def setUp(self):
+        if platform != 'pyboard':
+            # Sends take as long as on the wire, to time the strips
+            pyb.SPI.wire_time = True
+
+    def tearDown(self):
+        if platform != 'pyboard':
+            pyb.SPI.wire_time = False
+
+    def group(self, *counts):
+        strips = [WS2812(spi_bus=1 + k % 2, led_count=n)
+                  for k, n in enumerate(counts)]
+        return WSGroup(strips), strips
+
+    def testIndex(self):
+        group, (a, b) = self.group(5, 7)
+        self.assertEqual(len(group), 12)
+        self.assertEqual(group.locate(0), (0, 0))
+        self.assertEqual(group.locate(4), (0, 4))
+        self.assertEqual(group.locate(5), (1, 0))
+        self.assertEqual(group.locate(-1), (1, 6))
+        with self.assertRaises(IndexError):
+            group.locate(12)
+        with self.assertRaises(IndexError):
+            group.locate(-13)
+
+        group[6] = (1, 2, 3)
+        self.assertEqual(tuple(b[1]), (1, 2, 3))
+        self.assertEqual(tuple(group[6]), (1, 2, 3))
+        group[3:7] = [(i, i, i) for i in range(4)]
+        self.assertEqual(flat(group[3:7]), [(i, i, i) for i in range(4)])
+        self.assertEqual(tuple(a[4]), (1, 1, 1))
+        self.assertEqual(tuple(b[0]), (2, 2, 2))
+        self.assertEqual(len(list(group)), 12)
+
+    def testFillBuf(self):
+        data = [(i, 2*i, 3*i) for i in range(1, 13)]
+        for form in (list, iter, lambda d: bytes(v for t in d for v in t)):
+            group, (a, b) = self.group(5, 7)
+            group.fill_buf(form(data))
+            self.assertEqual(flat(a), data[:5])
+            self.assertEqual(flat(b), data[5:])
+            # Short data turns off the rest
+            group.fill_buf(form(data[:6]))
+            self.assertEqual(flat(a), data[:5])
+            self.assertEqual(flat(b), data[5:6] + [(0, 0, 0)] * 6)
+            group.fill_buf(form(data[:3]))
+            self.assertEqual(flat(a), data[:3] + [(0, 0, 0)] * 2)
+            self.assertEqual(flat(b), [(0, 0, 0)] * 7)
+
+    def testSync(self):
+        group, (a, b) = self.group(5, 7)
+        group.send_buf()
+        self.assertEqual([s.frames for s in group.stats], [1, 1])
+        # Only strips changed since are sent
+        group[6] = (9, 9, 9)
+        group.sync()
+        self.assertEqual([s.frames for s in group.stats], [1, 2])
+        group.sync()
+        self.assertEqual([s.frames for s in group.stats], [1, 2])
+        self.assertFalse(group.busy())
+        st = group.stats[1]
+        self.assertTrue(0 <= st.last_us <= st.max_us)
+        self.assertEqual(st.mean_us(), st.total_us // 2)
+
+    def testSyncPart(self):
+        # A strip changed only at its start sends only that far
+        group, (a, b) = self.group(100, 100)
+        group.send_buf()
+        whole_us = group.stats[1].last_us
+        group[101] = (9, 9, 9)
+        group.sync()
+        self.assertEqual([s.frames for s in group.stats], [1, 2])
+        self.assertEqual(b.dirty_to, 0)
+        self.assertTrue(group.stats[1].last_us < whole_us // 10,
+                        (group.stats[1].last_us, whole_us))
+        # And one changed throughout still sends the lot
+        b.fill((1, 2, 3))
+        group[1] = (9, 9, 9)
+        group.sync()
+        self.assertEqual([s.frames for s in group.stats], [2, 3])
+        self.assertTrue(group.stats[1].last_us > whole_us // 2)
+
+    @unittest.skipIf(platform == 'pyboard', "pyb.SPI sends one bus at a time")
+    def testConcurrent(self):
+        # Two strips on different buses take about as long as one
+        n = 300
+        group, strips = self.group(n, n)
+        for s in strips:
+            s.fill(b'\1\2\3')
+            s.sync()
+            s.fill(b'\3\2\1')
+        t0 = pyb.micros()
+        for s in strips:
+            s.sync()
+        serial_us = pyb.elapsed_micros(t0)
+        for s in strips:
+            s.fill(b'\1\2\3')
+        t0 = pyb.micros()
+        group.sync()
+        group_us = pyb.elapsed_micros(t0)
+        self.assertTrue(group_us < 0.8 * serial_us, (group_us, serial_us))
+        self.assertTrue(group.frame_us <= group_us)
+
+    @unittest.skipIf(platform == 'pyboard', "pyb.SPI sends one bus at a time")
+    def testConcurrentPart(self):
+        # Two strips changed in part are sent at once, not in turn
+        n = 300
+        group, (a, b) = self.group(n, n)
+        for s in (a, b):
+            s.fill(b'\1\2\3')
+        group.send_buf()
+        group[200] = (9, 9, 9)
+        group[n + 200] = (9, 9, 9)
+        bufs = [bytes(s.buf) for s in (a, b)]
+        group.sync()
+        self.assertEqual([s.frames for s in group.stats], [2, 2])
+        sum_us = sum(s.last_us for s in group.stats)
+        max_us = max(s.last_us for s in group.stats)
+        self.assertTrue(max_us <= group.frame_us < 0.8 * sum_us,
+                        (group.frame_us, max_us, sum_us))
+        # The byte zeroed after each span sent is put back
+        self.assertEqual([bytes(s.buf) for s in (a, b)], bufs)
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
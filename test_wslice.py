@@ -1,6 +1,7 @@
 import unittest
 import gc
-from ws2812 import WS2812, Pixel, PREALLOCATE, CACHE, RECREATE
+from ws2812 import WS2812, Pixel, PREALLOCATE, CACHE, RECREATE, \
+    CURSOR
 from wslice import WSlice
 
 # A helper
@@ -16,7 +17,7 @@ def tg(led_count, start):
 
 class WSliceTestCase(unittest.TestCase):
     names = """Attrs PixelAccess Rotate RotateInset RotatePart""".split()
-    names = """Attrs RotatePart""".split()
+    names = """Attrs RotatePart Dirty Iter Bulk RotateBy Phase""".split()
 
     def setUp(self):
         #logging.basicConfig(level=logging.INFO)
@@ -29,7 +30,7 @@ class WSliceTestCase(unittest.TestCase):
     #@unittest.skip("x")
     def testAllMemoryStrategies(self):
         print()
-        for mem in (PREALLOCATE, CACHE, RECREATE):
+        for mem in (PREALLOCATE, CACHE, RECREATE, CURSOR):
             for name in self.names:
                 fun = getattr(self, 'doTest'+name)
                 print("\tdoTest%s(mem==%d) ... " % (name, mem), end='')
@@ -49,6 +50,13 @@ class WSliceTestCase(unittest.TestCase):
         ws.fill_buf(tg(len(ws), 0))
         leds = WSlice(ws, 2, 4)
         self.assertEqual(leds.buf, ws.buf[12*2:12*4])
+        self.assertEqual(len(leds), 2)
+        self.assertEqual(len(WSlice(ws, 5)), 2)
+        if mem == CURSOR:
+            # No Pixel per LED, just the one cursor
+            self.assertFalse(hasattr(leds, 'pixels'))
+            self.assertIs(leds[1], leds.cursor)
+            self.assertEqual(tuple(leds[1]), tuple(ws[3]))
 
 
     def doTestPixelAccess(self, mem):
@@ -220,6 +228,150 @@ class WSliceTestCase(unittest.TestCase):
         self.assertEqual([tuple(led) for led in leds], [(0,1,2), (3,4,5), (6,7,8), (9,10,11)])
 
 
+    def doTestRotateBy(self, mem):
+        # A part of a WSlice can be rotated any amount in one go
+        ws = WS2812(spi_bus=1, led_count=12, mem=mem)
+        ws.fill_buf(tg(len(ws), 0))
+        leds = WSlice(ws, 1, 11)
+        ref = [tuple(led) for led in ws]
+        for k, start, stop in ((1, 0, 10), (3, 0, 10), (-2, 2, 9),
+                               (13, 1, 5), (7, 3, 3), (4, 4, 8), (0, 0, 10),
+                               (-11, 0, None), (1, 9, 20)):
+            ws.sync()
+            leds.rotate(k, start, stop)
+            part = ref[1+start:1+min(stop or 10, 10)]
+            if part:
+                j = k % len(part)
+                part = part[j:] + part[:j]
+                ref[1+start:1+start+len(part)] = part
+            self.assertEqual([tuple(led) for led in ws], ref)
+
+        # It agrees with cw() and ccw()
+        leds.rotate(2, 1, 7)
+        leds.ccw(1, 7)
+        leds.ccw(1, 7)
+        self.assertEqual([tuple(led) for led in ws], ref)
+        leds.rotate(-1)
+        leds.cw()
+        self.assertEqual([tuple(led) for led in ws], ref)
+        self.assertEqual(ws.dirty_to, 11)
+
+    def doTestPhase(self, mem):
+        # A WSlice with a phase is sent turned, as if rotated in place
+        class Recorder:
+            def __init__(self):
+                self.sent = []
+            def send(self, data):
+                self.sent.append(bytes(data))
+
+        ws = WS2812(spi_bus=1, led_count=12, mem=mem)
+        ref = WS2812(spi_bus=1, led_count=12, mem=mem)
+        ws.fill_buf(tg(len(ws), 0))
+        ref.fill_buf(tg(len(ref), 0))
+        ws.spi = Recorder()
+        a = WSlice(ws, 1, 5)
+        b = WSlice(ws, 6, 11)
+        ref_a = WSlice(ref, 1, 5)
+        ref_b = WSlice(ref, 6, 11)
+        buf = bytes(ws.buf)
+        for turn, sl, ref_sl in ((1, a, ref_a), (3, b, ref_b), (-2, a, ref_a),
+                                 (2, a, ref_a), (2, b, ref_b)):
+            ws.sync()
+            sl.spin(turn)
+            self.assertEqual(ws.dirty_to, sl.start + len(sl))
+            if turn > 0:
+                for i in range(turn):
+                    ref_sl.cw()
+            else:
+                for i in range(-turn):
+                    ref_sl.ccw()
+            ws.spi.sent = []
+            ws.send_buf()
+            # It goes out turned, in one piece, ending low
+            self.assertEqual(ws.spi.sent, [bytes(ref.buf)])
+            # The buffer itself is untouched
+            self.assertEqual(bytes(ws.buf), buf)
+        self.assertEqual(a.phase, 1)
+        self.assertEqual(b.phase, 0)
+        self.assertEqual(ws.spun, [a])
+
+        # A short sync sends as far as the end of a spun slice
+        ws.spi.sent = []
+        ws.sync(2)
+        self.assertEqual(b''.join(ws.spi.sent), bytes(ref.buf[:12*5]) + b'\0')
+
+        # The frame goes out in one transfer
+        ws.spi.sent = []
+        ws.send_buf()
+        self.assertEqual(len(ws.spi.sent), 1)
+
+        # Spun slices can't overlap
+        with self.assertRaises(ValueError):
+            WSlice(ws, 4, 8).spin()
+        self.assertEqual(ws.spun, [a])
+
+        # And present() sends its front buffer turned the same way
+        db = WS2812(spi_bus=1, led_count=12, mem=mem, double_buffer=True)
+        db.fill_buf(tg(len(db), 0))
+        db.spi = Recorder()
+        db._send_nowait = db.spi.send
+        WSlice(db, 1, 5).spin(1)
+        db.present()
+        self.assertEqual(db.spi.sent, [bytes(ref.buf)])
+        # Leaving the drawing as it was
+        self.assertEqual([tuple(led) for led in db],
+                         [tuple(t) for t in tg(len(db), 0)])
+
+    def doTestDirty(self, mem):
+        # Changes through a WSlice are noted in the underlying WS2812
+        ws = WS2812(spi_bus=1, led_count=10, mem=mem)
+        ws.sync()
+        self.assertEqual(ws.dirty_to, 0)
+        leds = WSlice(ws, 2, 6)
+        leds[1] = b'foo'
+        self.assertEqual(ws.dirty_to, 4)
+        ws.sync()
+        leds.cw(0, 2)
+        self.assertEqual(ws.dirty_to, 4)
+        ws.sync()
+        leds.ccw()
+        self.assertEqual(ws.dirty_to, 6)
+        ws.sync()
+        leds.shift(-1, 0, 3)
+        self.assertEqual(ws.dirty_to, 4)
+        ws.sync()
+        leds.update_buf(b'bar', 2)
+        self.assertEqual(ws.dirty_to, 5)
+
+    def doTestIter(self, mem):
+        # A WSlice iterates over its own pixels and values
+        ws = WS2812(spi_bus=1, led_count=10, mem=mem)
+        ws.fill_buf(tg(len(ws), 0))
+        leds = WSlice(ws, 3, 8)
+        expect = [tuple(t) for t in tg(len(ws), 0)][3:8]
+        self.assertEqual([tuple(p) for p in leds], expect)
+        self.assertEqual([tuple(v) for v in leds.iter_rgb()], expect)
+        for p in leds:
+            p.r = 0
+        self.assertEqual([tuple(p)[0] for p in ws],
+                         [0, 3, 6, 0, 0, 0, 0, 0, 24, 27])
+
+    def doTestBulk(self, mem):
+        # Fills, tiles and gradients work within a WSlice
+        ws = WS2812(spi_bus=1, led_count=10, mem=mem)
+        ws.sync()
+        leds = WSlice(ws, 2, 8)
+        leds.fill((1, 2, 3))
+        self.assertEqual(ws.dirty_to, 8)
+        leds.tile([(4, 5, 6), (7, 8, 9)], 1, 4)
+        leds.gradient((0, 0, 0), (10, 20, 30), 4)
+        self.assertEqual([tuple(p) for p in ws],
+                         [(0, 0, 0)] * 2 +
+                         [(1, 2, 3), (4, 5, 6), (7, 8, 9), (4, 5, 6),
+                          (0, 0, 0), (10, 20, 30)] +
+                         [(0, 0, 0)] * 2)
+
+
     @unittest.skip("FIXME: blows memory")
     def testRotatePlaces(self):
         # A chain can be rotated
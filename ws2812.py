@@ -5,16 +5,43 @@ from array import array
 from uctypes import addressof, bytearray_at
 from _collections import namedtuple
 from sys import platform
+from ws2812_encode import intensity_table, buf_bytes
 
 if platform == 'pyboard':
-    from ws2812_helper_pyb import _get, _set, _set_rgb_values, _clearLEDs
+    from ws2812_helper_pyb import _get, _set, _set_rgb_values, _set_rgb_span, \
+        _get_rgb_span, _clearLEDs
+    from ws2812_helper_pyb import _get3, _set3, _set_rgb_values3, \
+        _set_rgb_span3, _get_rgb_span3, _clearLEDs3
+    from ws2812_helper_pyb import _movewords, _reverseblocks
 else:
-    from ws2812_helper_sim import _get, _set, _set_rgb_values, _clearLEDs
+    from ws2812_helper_sim import _get, _set, _set_rgb_values, _set_rgb_span, \
+        _get_rgb_span, _clearLEDs
+    from ws2812_helper_sim import _get3, _set3, _set_rgb_values3, \
+        _set_rgb_span3, _get_rgb_span3, _clearLEDs3
+    from ws2812_helper_sim import _movewords, _reverseblocks
 
 # Values of "mem" to WS2812 init
 PREALLOCATE = 0
 CACHE = 1
 RECREATE = 2
+CURSOR = 3      # One Pixel, moved to whichever LED was last asked for
+
+# Types taken as flat r,g,b,r,g,b,... data. Built once, as a tuple
+# built in place would be garbage on the heap at every use.
+_flat_types = (bytearray, bytes, array, memoryview)
+
+def _is_flat(data):
+    # Whether data is flat r,g,b data, as a sequence of bytes. An array
+    # or memoryview must be of bytes; one of anything else is taken as
+    # a sequence of values, item by item. MicroPython's don't tell what
+    # they hold, and are taken to be of bytes.
+    if not isinstance(data, _flat_types):
+        return False
+    if isinstance(data, array):
+        return getattr(data, 'typecode', 'B') == 'B'
+    if isinstance(data, memoryview):
+        return getattr(data, 'format', 'B') == 'B'
+    return True
 
 class SubscriptableForPixel:
     # Provides subscripting of one's pixels
@@ -40,11 +67,16 @@ class SubscriptableForPixel:
                 raise IndexError("tried to get pixel", index)
 
             if mem >= RECREATE:
-                return Pixel(self.buf, 3*(index%length))
+                if mem == CURSOR:
+                    # A Pixel got before now points here too
+                    cursor = self.cursor
+                    cursor.i = 3*(index%length)
+                    return cursor
+                return self.pixel_class(self, 3*(index%length))
             index %= length
             pix = pixels[index]
             if pix is None:
-                pix = pixels[index] = Pixel(self.buf, index*3)
+                pix = pixels[index] = self.pixel_class(self, index*3)
             return pix
 
     def get_led_pixel_slice(self, index):
@@ -52,17 +84,11 @@ class SubscriptableForPixel:
         if mem <= CACHE:
             pixels = self.pixels
         length = len(self)
-        try:
-            start, stop, step = index.start, index.stop, index.step
-        except AttributeError:
-            # e.g. 'slice(3, 6, None)'
-            start, stop, step = eval(str(index)[5:])
-        #print(start, stop, step)
-        #print(list(range(length)[start:stop]))
-        # Could raise NotImplemented if step is not None
-        want = range(length)[start:stop]
+        want = range(length)[index]
         if mem >= RECREATE:
-            return [self[i] for i in want]
+            # A slice of cursors would be all the same one
+            pixel_class = self.pixel_class
+            return [pixel_class(self, 3*i) for i in want]
 
         # Hasn't happened, can probably remove:
         if isinstance(want, int):
@@ -76,7 +102,7 @@ class SubscriptableForPixel:
             # Make sure all the positions we're hitting are cached
             for i in want:
                 if pixels[i] is None:
-                    pixels[i] = Pixel(self.buf, 3*i)
+                    pixels[i] = self.pixel_class(self, 3*i)
 
         return pixels[index]
 
@@ -119,31 +145,250 @@ class SubscriptableForPixel:
         if isinstance(index, int):
             if not -length <= index < length:
                 raise IndexError("tried to set LED", index, "out of", length)
+            if index < 0:
+                index += length
+            rgb = self.rgb
+            if rgb is not None:
+                # Shadowed: just note the values, for sync() to encode
+                if not isinstance(value, (bytearray, bytes)):
+                    value = self._addressable(value)
+                i = 3*index
+                rgb[i] = value[0]
+                rgb[i+1] = value[1]
+                rgb[i+2] = value[2]
+                self.stale(index, index + 1)
+                return
             if not isinstance(value, bytearray):
                 value = self._addressable(value)
-            _set_rgb_values(self.buf, index, value)
+            self._set_rgb_values(self.buf, index, value, self.table)
+            self.touch(index + 1)
             return
 
         #else
         # assume it's a slice
+        # Work out its indices as slice.indices() would, without
+        # creating any objects on the heap
         try:
             start, stop, step = index.start, index.stop, index.step
         except AttributeError:
-            # e.g. 'slice(3, 6, None)'
-            start, stop, step = eval(str(index)[5:])
-        #print(start, stop, step)
-        #print(list(range(length)[start:stop]))
-        dests = range(length)[start:stop]
+            # No slice attributes in this build, so let a range do it
+            r = range(length)[index]
+            start, stop, step = r.start, r.stop, r.step
+        else:
+            if step is None:
+                step = 1
+            elif step == 0:
+                raise ValueError("slice step cannot be zero")
+            if start is None:
+                start = 0 if step > 0 else length - 1
+            elif start < 0:
+                start = max(start + length, 0 if step > 0 else -1)
+            else:
+                start = min(start, length if step > 0 else length - 1)
+            if stop is None:
+                stop = length if step > 0 else -1
+            elif stop < 0:
+                stop = max(stop + length, 0 if step > 0 else -1)
+            else:
+                stop = min(stop, length if step > 0 else length - 1)
+        if step > 0:
+            n = max((stop - start + step - 1) // step, 0)
+        else:
+            n = max((start - stop - step - 1) // -step, 0)
 
-        for i, v in zip(dests, value):
-            #print("i", i, "v", v, end=' ')
-            v = self._addressable(v)
-            #print("now v is", v)
-            _set_rgb_values(self.buf, i, v)
+        # Values go to the LEDs in turn until either runs out
+        rgb = self.rgb
+        i = start
+        if _is_flat(value):
+            # Flat r,g,b data
+            n = min(n, len(value) // 3)
+            if step == 1 and rgb is None:
+                self._set_rgb_span(self.buf, start, value, n, self.table)
+            else:
+                for k in range(n):
+                    if rgb is None:
+                        self._set_rgb_span(self.buf, i, value, 1, self.table, k)
+                    else:
+                        j = 3*i
+                        rgb[j] = value[3*k]
+                        rgb[j+1] = value[3*k+1]
+                        rgb[j+2] = value[3*k+2]
+                    i += step
+        else:
+            k = 0
+            for v in value:
+                if k == n:
+                    break
+                if rgb is None:
+                    self._set_rgb_values(self.buf, i, self._addressable(v),
+                                         self.table)
+                else:
+                    self.set_led(i, v)
+                i += step
+                k += 1
+            n = k
+        if n:
+            last = start + (n-1)*step
+            if rgb is None:
+                self.touch(max(start, last) + 1)
+            else:
+                self.stale(min(start, last), max(start, last) + 1)
 
 
     __setitem__ = set_led
 
+    def read_into(self, dest, start=0, stop=None):
+        # Decode LEDs [start, stop) into dest as flat r,g,b,r,g,b,...
+        # in one call, without creating any per-pixel objects.
+        # dest is a bytearray (or array('B')) of at least 3*(stop-start)
+        # Returns the number of LEDs read
+        length = len(self)
+        if stop is None or stop > length:
+            stop = length
+        qty = stop - start
+        if qty <= 0:
+            return 0
+        if start < 0 or 3*qty > len(dest):
+            raise IndexError("tried to read LEDs", start, "to", stop,
+                             "into", len(dest), "bytes")
+        rgb = self.rgb
+        if rgb is not None:
+            i = 3*start
+            for k in range(3*qty):
+                dest[k] = rgb[i + k]
+            return qty
+        self._get_rgb_span(self.buf, start, dest, qty)
+        return qty
+
+    def __iter__(self):
+        # Iterate over the pixels directly, rather than by indexing
+        # until IndexError
+        if self.mem == PREALLOCATE:
+            return iter(self.pixels)
+        return self._iter_pixels()
+
+    def _iter_pixels(self):
+        mem = self.mem
+        n = len(self)
+        if mem == CURSOR:
+            cursor = self.cursor
+            for i in range(0, 3*n, 3):
+                cursor.i = i
+                yield cursor
+        elif mem == CACHE:
+            pixels = self.pixels
+            pixel_class = self.pixel_class
+            for k in range(n):
+                pix = pixels[k]
+                if pix is None:
+                    pix = pixels[k] = pixel_class(self, 3*k)
+                yield pix
+        else:
+            pixel_class = self.pixel_class
+            for i in range(0, 3*n, 3):
+                yield pixel_class(self, i)
+
+    def iter_rgb(self):
+        # Yield the r,g,b values of each LED in turn, decoded into one
+        # bytearray(3) that is reused throughout, so copy it to keep it
+        rgb = bytearray(3)
+        buf = self.buf
+        shadow = self.rgb
+        get_rgb_span = self._get_rgb_span
+        for i in range(len(self)):
+            if shadow is None:
+                get_rgb_span(buf, i, rgb, 1)
+            else:
+                k = 3*i
+                rgb[0] = shadow[k]
+                rgb[1] = shadow[k+1]
+                rgb[2] = shadow[k+2]
+            yield rgb
+
+    def fill(self, color, start=0, stop=None):
+        # Set LEDs [start, stop) all to color, encoding it just once
+        stop = self._bulk_stop(start, stop)
+        if stop > start:
+            self.set_led(start, color)
+            self._replicate(start, 1, stop)
+
+    def tile(self, pattern, start=0, stop=None):
+        # Repeat pattern, a sequence of colors or flat r,g,b data, over
+        # LEDs [start, stop), encoding it just once
+        stop = self._bulk_stop(start, stop)
+        if _is_flat(pattern):
+            period = len(pattern) // 3
+        else:
+            period = len(pattern)
+        period = min(period, stop - start)
+        if period > 0:
+            self[start:start+period] = pattern
+            self._replicate(start, period, stop)
+
+    _gb = bytearray(3*16)
+    def gradient(self, c0, c1, start=0, stop=None):
+        # Blend LEDs [start, stop) evenly from color c0 to color c1,
+        # encoding up to 16 LEDs at a time
+        stop = self._bulk_stop(start, stop)
+        n = stop - start
+        if n <= 0:
+            return
+        r0, g0, b0 = c0
+        dr, dg, db = c1[0] - r0, c1[1] - g0, c1[2] - b0
+        d = max(n - 1, 1)
+        half = d // 2
+        b = self._gb
+        where = start
+        k = 0
+        while k < n:
+            m = min(n - k, len(b) // 3)
+            for j in range(0, 3*m, 3):
+                b[j] = r0 + (dr*k + half) // d
+                b[j+1] = g0 + (dg*k + half) // d
+                b[j+2] = b0 + (db*k + half) // d
+                k += 1
+            self[where:where+m] = b
+            where += m
+
+    def _bulk_stop(self, start, stop):
+        # The checked stop of a bulk operation on LEDs [start, stop)
+        length = len(self)
+        if stop is None or stop > length:
+            stop = length
+        if start < 0:
+            raise IndexError("tried to fill from LED", start)
+        return stop
+
+    def _replicate(self, start, period, stop):
+        # Repeat the period LEDs from start on, already set, to fill LEDs
+        # [start, stop), by doubling the run copied each time.
+        # 4-bit encoded LEDs are whole words, moved by _movewords; the
+        # compact encoding and the shadow are copied as bytes.
+        rgb = self.rgb
+        if rgb is not None:
+            buf, width = rgb, 3
+        else:
+            buf, width = self.buf, 3*self.spi_bits
+        done = period
+        qty = stop - start
+        if width == 12:
+            a = addressof(buf) + 12*start
+            while done < qty:
+                n = min(done, qty - done)
+                _movewords(a + 12*done, a, 3*n)
+                done += n
+        else:
+            mv = memoryview(buf)
+            i = width*start
+            while done < qty:
+                n = min(done, qty - done)
+                mv[i + width*done:i + width*(done + n)] = mv[i:i + width*n]
+                done += n
+        if rgb is not None:
+            self.stale(start, stop)
+        else:
+            self.touch(stop)
+
 
 class WS2812(SubscriptableForPixel):
     # Driver for WS2812 RGB LEDs. May be used for controlling single LED or chain
@@ -171,48 +416,109 @@ class WS2812(SubscriptableForPixel):
     #
     # Version: 1.5
 
-    buf_bytes = (0x11, 0x13, 0x31, 0x33)
+    buf_bytes = buf_bytes
     ReadOnlyPixel = namedtuple('Pixel', 'r g b')
 
-    def __init__(self, spi_bus=1, led_count=1, intensity=1, mem=PREALLOCATE):
+    def __init__(self, spi_bus=1, led_count=1, intensity=1, mem=PREALLOCATE,
+                 double_buffer=False, shadow=False, spi_bits=4, gamma=1):
         #Params:
         # spi_bus = SPI bus ID (1 or 2)
         # led_count = count of LEDs
         # intensity = light intensity (float up to 1)
+        # gamma = exponent applied to values as they are encoded, e.g.
+        #   2.2 to make steps in value look even to the eye
         # mem = how stingy to be with memory (comes at a speed & GC cost)
+        # double_buffer = keep a second buffer for present() to send from
+        # shadow = keep the plain RGB values as well, encoding at sync()
+        # spi_bits = SPI bits per data bit: 4, or 3 for the compact
+        #   encoding, which takes 9 rather than 12 bytes per LED
+        if spi_bits not in (3, 4):
+            raise ValueError("spi_bits must be 3 or 4")
         self.led_count = led_count
-        self.intensity = intensity # FIXME: intensity is ignored
         self.mem = mem
         # 0 prealloc
         # 1 cache
         # 2 create Pixel each time
+        # 3 one Pixel, moved to each LED asked for
 
         # prepare SPI data buffer (4 bytes for each color for each pixel,
-        # with an additional zero byte at the end to make sure the data line
-        # comes to rest low)
-        self.buf = bytearray(4*3*led_count + 1)
+        # or 3 if compact, with an additional zero byte at the end to make
+        # sure the data line comes to rest low)
+        self.spi_bits = spi_bits
+        self.buf = bytearray(spi_bits*3*led_count + 1)
+
+        # The encoders and decoders for the buffer
+        if spi_bits == 4:
+            self._get = _get
+            self._set_rgb_values = _set_rgb_values
+            self._set_rgb_span = _set_rgb_span
+            self._get_rgb_span = _get_rgb_span
+            self._clearLEDs = _clearLEDs
+        else:
+            self._get = _get3
+            self._set_rgb_values = _set_rgb_values3
+            self._set_rgb_span = _set_rgb_span3
+            self._get_rgb_span = _get_rgb_span3
+            self._clearLEDs = _clearLEDs3
+
+        # LEDs [0, dirty_to) may have changed since they were last sent
+        self.dirty_to = 0
+        # A count of the writes to the LEDs, by which a Lights can tell
+        # whether something else wrote them since it last rendered
+        self.writes = 0
+
+        # With double buffering, self.buf is drawn into while present()
+        # sends a copy of the previous frame from self.front
+        if double_buffer:
+            self.front = bytearray(len(self.buf))
+        else:
+            self.front = None
+
+        # With a shadow, writes and reads go to plain r,g,b values in
+        # self.rgb (3 bytes per pixel), and LEDs [stale_from, stale_to)
+        # are encoded into self.buf only when it is to be sent
+        if shadow:
+            self.rgb = bytearray(3*led_count)
+            self.pixel_class = ShadowPixel
+        else:
+            self.rgb = None
+            self.pixel_class = Pixel if spi_bits == 4 else CompactPixel
+        self.stale_from = led_count
+        self.stale_to = 0
+
+        # WSlices with a phase, by start, which are sent rotated
+        self.spun = []
 
         if mem <= CACHE:
             # Prepare a cache by index of Pixel objects
             self.pixels = pixels = [None] * led_count
             if mem == PREALLOCATE: # Pre-allocate the pixels
                 for i in range(led_count):
-                    pixels[i] = Pixel(self.buf, 3*i)
-
-        # OBSOLETE
-        #self.bits = array('L', range(256))
-        #bb = bytearray_at(addressof(self.bits), 4*256)
-        #mask = 0x03
-        #buf_bytes = self.buf_bytes
-        #for i in range(256):
-        #    index = 4*i
-        #    bb[index] = buf_bytes[i >> 6 & 0x03]
-        #    bb[index+1] = buf_bytes[i >> 4 & 0x03]
-        #    bb[index+2] = buf_bytes[i >> 2 & 0x03]
-        #    bb[index+3] = buf_bytes[i & 0x03]
+                    pixels[i] = self.pixel_class(self, 3*i)
+        elif mem == CURSOR:
+            self.cursor = self.pixel_class(self, 0)
+
+        # The table of encoded words by byte value, shared by all
+        # instances at intensity 1 and gamma 1 (see ws2812_encode)
+        self.table = intensity_table(intensity, spi_bits, None, gamma)
+        self._intensity = intensity
+        self._gamma = gamma
 
         # SPI init
-        self.spi = pyb.SPI(spi_bus, pyb.SPI.MASTER, baudrate=3200000, polarity=0, phase=1)
+        # The compact encoding wants ~2.4MHz. The pyboard divides its
+        # 84MHz (SPI1) or 42MHz (SPI2) clock by a power of 2 to no more
+        # than what is asked, so ask for the 2.625MHz it can do; asking
+        # for 2.4MHz would get 1.3125MHz, too slow for the LEDs.
+        baudrate = 3200000 if spi_bits == 4 else 2625000
+        self.spi = spi = pyb.SPI(spi_bus, pyb.SPI.MASTER, baudrate=baudrate, polarity=0, phase=1)
+        # An SPI that can send without waiting for the data to go out
+        # (as the pyb mock does) lets present() overlap the send with
+        # drawing the next frame. Otherwise present() blocks like sync().
+        self._send_nowait = getattr(spi, 'send_nowait', spi.send)
+        self._spi_busy = getattr(spi, 'busy', None)
+        # The byte zeroed after a span being sent without waiting, as
+        # (index, value) to put back when it is sent, or None
+        self._lowered = None
 
         # turn LEDs off
         self.show([])
@@ -220,14 +526,83 @@ class WS2812(SubscriptableForPixel):
     def __len__(self):
         return self.led_count
 
+    @property
+    def intensity(self):
+        return self._intensity
+
+    @intensity.setter
+    def intensity(self, v):
+        # Intensity is applied by the encoder through a scaled table,
+        # which is only rebuilt here. Values already in the buffer are
+        # not re-encoded, and values read back are as scaled.
+        # With a shadow, all is re-encoded at the next send instead.
+        if v == self._intensity:
+            return
+        self._intensity = v
+        self._retable()
+
+    @property
+    def gamma(self):
+        return self._gamma
+
+    @gamma.setter
+    def gamma(self, v):
+        # Gamma is applied by the encoder too, as intensity is
+        if v == self._gamma:
+            return
+        self._gamma = v
+        self._retable()
+
+    def _retable(self):
+        if self.rgb is not None:
+            self.stale(0, self.led_count)
+        self.table = intensity_table(self._intensity, self.spi_bits,
+                                     self.table, self._gamma)
+
+    def touch(self, stop=None):
+        # Note that LEDs before stop (default all) have changed, for
+        # sync() to send. Writes through this driver do this for you.
+        if stop is None or stop > self.led_count:
+            stop = self.led_count
+        self.writes += 1
+        if stop > self.dirty_to:
+            self.dirty_to = stop
+
+    def stale(self, start, stop):
+        # Note that shadow LEDs [start, stop) need encoding before they
+        # are sent
+        self.writes += 1
+        if start < self.stale_from:
+            self.stale_from = start
+        if stop > self.stale_to:
+            self.stale_to = stop
+
+    def encode_stale(self):
+        # Encode the shadow LEDs changed since they were last encoded
+        start = self.stale_from
+        stop = self.stale_to
+        if stop > start:
+            self._set_rgb_span(self.buf, start, self.rgb, stop - start,
+                               self.table, start)
+            # Not a write of the LEDs, which stale() counted
+            if stop > self.dirty_to:
+                self.dirty_to = stop
+        self.stale_from = self.led_count
+        self.stale_to = 0
+
     def get_led_values(self, index, rgb=None):
         # The asm function is unguarded as to index, so enforce here
         if index >= self.led_count or index < -self.led_count:
             raise IndexError("tried to get values at", index)
+        index %= self.led_count
         ix = index * 3
-        return self.ReadOnlyPixel(_get(self.buf, ix+1), \
-                                  _get(self.buf, ix+0), \
-                                  _get(self.buf, ix+2))
+        rgb = self.rgb
+        if rgb is not None:
+            return self.ReadOnlyPixel(rgb[ix], rgb[ix+1], rgb[ix+2])
+        get = self._get
+        return self.ReadOnlyPixel(get(self.buf, ix+1), \
+                                  get(self.buf, ix+0), \
+                                  get(self.buf, ix+2))
 
     def show(self, data):
         # Show RGB data on LEDs. Expected data = [(R, G, B), ...] where R, G and B
@@ -238,17 +613,170 @@ class WS2812(SubscriptableForPixel):
 
     def send_buf(self):
         #Send buffer over SPI.
-        self.spi.send(self.buf)
+        self.wait()
+        if self.rgb is not None:
+            self.encode_stale()
+        if self.spun:
+            self._send_spun(self.buf, self.led_count)
+        else:
+            self.spi.send(self.buf)
+        self.dirty_to = 0
+
+    def send_buf_nowait(self):
+        # Start sending the buffer, returning while it goes out if the
+        # SPI can do that (see present()). The buffer must not then be
+        # drawn in until not busy(). Spun WSlices are turned in the
+        # buffer to be sent, and back after, so a chain with any is
+        # sent before this returns.
+        self.wait()
+        if self.rgb is not None:
+            self.encode_stale()
+        if self.spun:
+            self._send_spun(self.buf, self.led_count)
+        else:
+            self._send_nowait(self.buf)
+        self.dirty_to = 0
 
     def sync(self, to=None):
-        if to is None:
+        # Send the first `to` LEDs over SPI. By default that is as far
+        # as the last LED changed since the last send, and nothing at
+        # all if none were changed.
+        to = self._dirty(to)
+        if not to:
+            return
+        if self.spun:
+            self._send_spun(self.buf, min(to, self.led_count))
+        elif to >= self.led_count:
             self.spi.send(self.buf)
         else:
-            short_buf = bytearray_at(addressof(self.buf), 3*4*to + 1) # extra byte
-            t = short_buf[-1]
-            short_buf[-1] = 0
-            self.spi.send(short_buf)
-            short_buf[-1] = t
+            self._send_span(self.buf, 0, to)
+
+    def sync_nowait(self, to=None):
+        # As sync(), but returning while the LEDs go out if the SPI can
+        # do that (see present()). The buffer must not then be drawn in
+        # until wait() returns or busy() is False, which also puts back
+        # the byte after the LEDs sent. A chain with spun WSlices is
+        # sent before this returns.
+        to = self._dirty(to)
+        if not to:
+            return
+        if self.spun:
+            self._send_spun(self.buf, min(to, self.led_count))
+        elif to >= self.led_count:
+            self._send_nowait(self.buf)
+        else:
+            self._send_span_nowait(self.buf, 0, to)
+
+    def _dirty(self, to):
+        # How far sync(to) sends, with the buffer encoded and, if that
+        # is as far as it has changed, marked clean
+        self.wait()
+        if self.rgb is not None:
+            self.encode_stale()
+        if to is None:
+            to = self.dirty_to
+        if to >= self.dirty_to:
+            self.dirty_to = 0
+        return to
+
+    def _send_span(self, buf, start, stop):
+        # Send LEDs [start, stop) of buf, with a zero byte after them to
+        # bring the data line to rest low
+        if stop <= start:
+            return
+        w = 3*self.spi_bits
+        i = w*stop
+        t = buf[i]
+        buf[i] = 0
+        self.spi.send(bytearray_at(addressof(buf) + w*start,
+                                   w*(stop - start) + 1))
+        buf[i] = t
+
+    def _send_span_nowait(self, buf, start, stop):
+        # As _send_span, but the zeroed byte is put back by busy() or
+        # wait() once the span is sent
+        if stop <= start:
+            return
+        w = 3*self.spi_bits
+        i = w*stop
+        self._lowered = (i, buf[i])
+        buf[i] = 0
+        self._send_nowait(bytearray_at(addressof(buf) + w*start,
+                                       w*(stop - start) + 1))
+        if self._spi_busy is None:
+            self._raise()
+
+    def _raise(self):
+        # Put back the byte zeroed by _send_span_nowait
+        lowered = self._lowered
+        if lowered is not None:
+            self.buf[lowered[0]] = lowered[1]
+            self._lowered = None
+
+    def _turn(self, buf, back=False):
+        # Turn each spun WSlice in buf by its phase, or back again, in
+        # place: by reversals of runs of LEDs, which are word moves
+        a = addressof(buf)
+        for sl in self.spun:
+            n = len(sl)
+            k = n - sl.phase if back else sl.phase
+            start = a + 12*sl.start
+            _reverseblocks(start, k, 3)
+            _reverseblocks(start + 12*k, n - k, 3)
+            _reverseblocks(start, n, 3)
+
+    def _send_spun(self, buf, to):
+        # Send LEDs [0, to) of buf, or on to the end of a spun WSlice,
+        # with each spun WSlice turned by its phase. The turning is
+        # done only now, in place, so the frame goes out in one
+        # transfer with no gaps in it, and is undone after.
+        for sl in self.spun:
+            end = sl.start + len(sl)
+            if sl.start < to < end:
+                to = end
+        self._turn(buf)
+        if to >= self.led_count:
+            self.spi.send(buf)
+        else:
+            self._send_span(buf, 0, to)
+        self._turn(buf, back=True)
+
+    def present(self):
+        # Show the frame drawn in the buffer, double-buffered: wait for
+        # the previous frame to be sent, copy this one to the front
+        # buffer and start sending it. Drawing of the next frame can
+        # then go on while this one is sent, where the SPI has a
+        # send_nowait() (as the pyb mock does). pyb.SPI has none, so on
+        # a pyboard present() blocks for the send as sync() does.
+        front = self.front
+        if front is None:
+            raise ValueError("present() needs double_buffer=True")
+        if self._lowered is not None:
+            # A span of the buffer itself is still being sent
+            self.wait()
+        if self.rgb is not None:
+            self.encode_stale()
+        self.wait()
+        front[:] = self.buf
+        if self.spun:
+            # The copy can stay turned, as the next frame replaces it
+            self._turn(front)
+        self._send_nowait(front)
+        self.dirty_to = 0
+
+    def busy(self):
+        # Whether a frame started by present() (or send_buf_nowait() or
+        # sync_nowait()) is still being sent
+        busy = self._spi_busy
+        if busy is not None and busy():
+            return True
+        self._raise()
+        return False
+
+    def wait(self):
+        # Wait for a frame started by present() to finish being sent
+        while self.busy():
+            pass
 
     _ubb = bytearray(3)
     def update_buf(self, data, where=0):
@@ -257,6 +785,10 @@ class WS2812(SubscriptableForPixel):
         # data is an iterable that returns an iterable
         # e.g. [(1,2,3), (4,5,6)]
         # or some generator of tuples or generators
+        # or flat RGB data, e.g. bytes((1,2,3, 4,5,6)), which is
+        # encoded in one call
+        if _is_flat(data):
+            return self.update_buf_rgb(data, where)
         set_led = self.set_led
         b = self._ubb
         for d in data:
@@ -267,6 +799,26 @@ class WS2812(SubscriptableForPixel):
             where += 1
         return where
 
+    def update_buf_rgb(self, data, where=0):
+        # Fill a part of the buffer from flat RGB data in one call.
+        # Returns the index of the first unfilled LED
+        # data is a bytes, bytearray or array('B') of r,g,b,r,g,b,...
+        # The asm function is unguarded as to index, so enforce here
+        qty = len(data) // 3
+        if not 0 <= where <= self.led_count - qty:
+            raise IndexError("tried to fill LEDs", where, "to", where + qty,
+                             "out of", self.led_count)
+        rgb = self.rgb
+        if rgb is not None:
+            i = 3*where
+            for k in range(3*qty):
+                rgb[i + k] = data[k]
+            self.stale(where, where + qty)
+            return where + qty
+        self._set_rgb_span(self.buf, where, data, qty, self.table)
+        self.touch(where + qty)
+        return where + qty
+
     def fill_buf(self, data):
         # Fill buffer with RGB data.
         # All LEDs after the data are turned off.
@@ -276,49 +828,230 @@ class WS2812(SubscriptableForPixel):
         #b = self.buf
         #for i in range(4*3*end, 4*3*self.led_count):
         #    b[i] = 0x11   # off
-        _clearLEDs(self.buf, end, self.led_count-end)
+        rgb = self.rgb
+        if rgb is not None:
+            for i in range(3*end, len(rgb)):
+                rgb[i] = 0
+            self.stale(end, self.led_count)
+            return
+        self._clearLEDs(self.buf, end, self.led_count-end)
+        self.touch()
+
+
+class WS2812Stream:
+    # Driver for chains too long to keep encoded in memory. It has
+    # buffers for only two chunks of LEDs; show() encodes the data a
+    # chunk at a time, sending each chunk as soon as it is encoded.
+    #
+    # The LEDs latch what they have as soon as the data line rests low
+    # for the reset time, ~50us for a WS2812 (~280us for a WS2812B), so
+    # the gap between chunks must stay shorter than that or the rest of
+    # the chain takes the next chunk as a new frame. Each chunk ends low
+    # (in the extra zero byte), so the gap only stretches the low of the
+    # last bit. If the SPI can send without waiting (send_nowait), the
+    # next chunk is encoded while this one goes out, and the gap is just
+    # what encoding takes beyond the time on the wire. Otherwise the gap
+    # is the whole time to encode a chunk, so use flat data (which is
+    # encoded in one call) or small chunks.
+    #
+    # Example:
+    #    chain = WS2812Stream(spi_bus=1, led_count=3000, chunk=32)
+    #    chain.show(some_generator_of_rgb_tuples())
+    #
+    # After show(), max_gap_us is the longest the line sat idle between
+    # chunks and late is how many gaps were longer than reset_us. When
+    # sending without waiting these are upper bounds, as the time on the
+    # wire of the chunk before is counted too.
+
+    reset_us = 50
+
+    def __init__(self, spi_bus=1, led_count=1, intensity=1, chunk=32,
+                 spi_bits=4, gamma=1):
+        #Params:
+        # spi_bus = SPI bus ID (1 or 2)
+        # led_count = count of LEDs
+        # intensity = light intensity (float up to 1)
+        # gamma = exponent applied to values as they are encoded
+        # chunk = count of LEDs encoded and sent at a time
+        # spi_bits = SPI bits per data bit, as for WS2812
+        if spi_bits not in (3, 4):
+            raise ValueError("spi_bits must be 3 or 4")
+        self.led_count = led_count
+        self.chunk = chunk
+        self.spi_bits = spi_bits
+        if spi_bits == 4:
+            self._set_rgb_values = _set_rgb_values
+            self._set_rgb_span = _set_rgb_span
+            self._clearLEDs = _clearLEDs
+        else:
+            self._set_rgb_values = _set_rgb_values3
+            self._set_rgb_span = _set_rgb_span3
+            self._clearLEDs = _clearLEDs3
+
+        # Two chunk buffers, one to encode into while the other is sent,
+        # each with an extra zero byte to bring the data line to rest low
+        n = spi_bits*3*chunk + 1
+        self.bufs = (bytearray(n), bytearray(n))
+
+        self.table = intensity_table(intensity, spi_bits, None, gamma)
+        self._intensity = intensity
+        self._gamma = gamma
+        self.max_gap_us = 0
+        self.late = 0
+
+        baudrate = 3200000 if spi_bits == 4 else 2625000 # see WS2812
+        self.spi = spi = pyb.SPI(spi_bus, pyb.SPI.MASTER, baudrate=baudrate, polarity=0, phase=1)
+        self._send_nowait = getattr(spi, 'send_nowait', spi.send)
+        self._spi_busy = getattr(spi, 'busy', None)
+
+        # turn LEDs off
+        self.show([])
+
+    def __len__(self):
+        return self.led_count
+
+    @property
+    def intensity(self):
+        return self._intensity
+
+    @intensity.setter
+    def intensity(self, v):
+        # Applies from the next show()
+        self._intensity = v
+        self.table = intensity_table(v, self.spi_bits, self.table,
+                                     self._gamma)
+
+    @property
+    def gamma(self):
+        return self._gamma
+
+    @gamma.setter
+    def gamma(self, v):
+        # Applies from the next show()
+        self._gamma = v
+        self.table = intensity_table(self._intensity, self.spi_bits,
+                                     self.table, v)
+
+    _ubb = bytearray(3)
+    def _encode(self, buf, data, where, qty):
+        # Encode up to qty LEDs of data into buf, returning how many.
+        # data is as for WS2812.update_buf: an iterator of (r,g,b)
+        # iterables, or flat r,g,b bytes from LED where on.
+        table = self.table
+        if _is_flat(data):
+            qty = max(min(qty, len(data)//3 - where), 0)
+            self._set_rgb_span(buf, 0, data, qty, table, where)
+            return qty
+        set_rgb_values = self._set_rgb_values
+        b = self._ubb
+        i = 0
+        for d in data:
+            if not isinstance(d, bytearray):
+                b[0], b[1], b[2] = d
+                d = b
+            set_rgb_values(buf, i, d, table)
+            i += 1
+            if i == qty:
+                break
+        return i
+
+    def show(self, data):
+        # Show RGB data on LEDs, as WS2812.show does. All LEDs after the
+        # data are turned off.
+        if not _is_flat(data):
+            data = iter(data)
+        bufs = self.bufs
+        chunk = self.chunk
+        width = 3*self.spi_bits
+        send = self._send_nowait
+        max_gap = 0
+        late = 0
+        k = 0
+        where = 0
+        t0 = None
+        while where < self.led_count:
+            buf = bufs[k]
+            qty = min(chunk, self.led_count - where)
+            n = self._encode(buf, data, where, qty)
+            self._clearLEDs(buf, n, qty - n)
+            if qty < chunk:
+                buf = bytearray_at(addressof(buf), width*qty + 1)
+                buf[-1] = 0 # overwrites LED qty, re-encoded before sent
+            if t0 is not None and not self.busy():
+                gap = pyb.elapsed_micros(t0)
+                if gap > max_gap:
+                    max_gap = gap
+                if gap > self.reset_us:
+                    late += 1
+            send(buf)
+            t0 = pyb.micros()
+            where += qty
+            k ^= 1
+        self.wait()
+        self.max_gap_us = max_gap
+        self.late = late
+
+    def busy(self):
+        # Whether the last chunk is still being sent
+        busy = self._spi_busy
+        return busy is not None and busy()
+
+    def wait(self):
+        while self.busy():
+            pass
 
 
 class Pixel:
     cmap = (1,0,2)
+    __slots__ = ('chain', 'i')
 
-    def __init__(self, a, i):
-        self.a = a
+    def __init__(self, chain, i):
+        # chain is the WS2812 (or WSlice) whose buffer and encode
+        # table this pixel uses
+        self.chain = chain
         self.i = i
 
     @property
     def r(self):
-        return _get(self.a, self.i+1)
+        return _get(self.chain.buf, self.i+1)
 
     @r.setter
     def r(self, v):
-        _set(self.a, self.i+1, v)
+        chain = self.chain
+        _set(chain.buf, self.i+1, v, chain.table)
+        chain.touch(self.i//3 + 1)
 
     @property
     def g(self):
-        return _get(self.a, self.i)
+        return _get(self.chain.buf, self.i)
 
     @g.setter
     def g(self, v):
-        _set(self.a, self.i, v)
+        chain = self.chain
+        _set(chain.buf, self.i, v, chain.table)
+        chain.touch(self.i//3 + 1)
 
     @property
     def b(self):
-        return _get(self.a, self.i+2)
+        return _get(self.chain.buf, self.i+2)
 
     @b.setter
     def b(self, v):
-        _set(self.a, self.i+2, v)
+        chain = self.chain
+        _set(chain.buf, self.i+2, v, chain.table)
+        chain.touch(self.i//3 + 1)
 
     def __getitem__(self, i):
         if i >= 3 or i < 0:
             raise IndexError("only 3 colors")
-        return _get(self.a, self.i + self.cmap[i])
+        return _get(self.chain.buf, self.i + self.cmap[i])
 
     def __setitem__(self, i, v):
         if i >= 3 or i < 0:
             raise IndexError("only 3 colors")
-        return _set(self.a, self.i + self.cmap[i], v)
+        chain = self.chain
+        _set(chain.buf, self.i + self.cmap[i], v, chain.table)
+        chain.touch(self.i//3 + 1)
 
     def off(self):
         self.r = self.b = self.g = 0
@@ -328,6 +1061,104 @@ class Pixel:
 
     def __repr__(self):
         return "<Pixel %d (%d, %d, %d) of chain 0x%x>" % \
-            (self.i//3, self.r, self.g, self.b, addressof(self.a))
+            (self.i//3, self.r, self.g, self.b, addressof(self.chain.buf))
+
+
+class CompactPixel(Pixel):
+    # A Pixel of a chain in the compact encoding (3 bytes per value)
+    __slots__ = ()
+
+    @property
+    def r(self):
+        return _get3(self.chain.buf, self.i+1)
+
+    @r.setter
+    def r(self, v):
+        chain = self.chain
+        _set3(chain.buf, self.i+1, v, chain.table)
+        chain.touch(self.i//3 + 1)
+
+    @property
+    def g(self):
+        return _get3(self.chain.buf, self.i)
+
+    @g.setter
+    def g(self, v):
+        chain = self.chain
+        _set3(chain.buf, self.i, v, chain.table)
+        chain.touch(self.i//3 + 1)
+
+    @property
+    def b(self):
+        return _get3(self.chain.buf, self.i+2)
+
+    @b.setter
+    def b(self, v):
+        chain = self.chain
+        _set3(chain.buf, self.i+2, v, chain.table)
+        chain.touch(self.i//3 + 1)
+
+    def __getitem__(self, i):
+        if i >= 3 or i < 0:
+            raise IndexError("only 3 colors")
+        return _get3(self.chain.buf, self.i + self.cmap[i])
+
+    def __setitem__(self, i, v):
+        if i >= 3 or i < 0:
+            raise IndexError("only 3 colors")
+        chain = self.chain
+        _set3(chain.buf, self.i + self.cmap[i], v, chain.table)
+        chain.touch(self.i//3 + 1)
+
+
+class ShadowPixel(Pixel):
+    # A Pixel of a chain with an RGB shadow, which it reads and writes
+    # as plain bytes
+    cmap = (0,1,2)
+    __slots__ = ()
+
+    @property
+    def r(self):
+        return self.chain.rgb[self.i]
 
+    @r.setter
+    def r(self, v):
+        i = self.i
+        chain = self.chain
+        chain.rgb[i] = v & 0xff
+        chain.stale(i//3, i//3 + 1)
+
+    @property
+    def g(self):
+        return self.chain.rgb[self.i+1]
+
+    @g.setter
+    def g(self, v):
+        i = self.i
+        chain = self.chain
+        chain.rgb[i+1] = v & 0xff
+        chain.stale(i//3, i//3 + 1)
+
+    @property
+    def b(self):
+        return self.chain.rgb[self.i+2]
 
+    @b.setter
+    def b(self, v):
+        i = self.i
+        chain = self.chain
+        chain.rgb[i+2] = v & 0xff
+        chain.stale(i//3, i//3 + 1)
+
+    def __getitem__(self, i):
+        if i >= 3 or i < 0:
+            raise IndexError("only 3 colors")
+        return self.chain.rgb[self.i + i]
+
+    def __setitem__(self, i, v):
+        if i >= 3 or i < 0:
+            raise IndexError("only 3 colors")
+        k = self.i
+        chain = self.chain
+        chain.rgb[k + i] = v & 0xff
+        chain.stale(k//3, k//3 + 1)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# Encoding of color values as the SPI bit patterns a WS2812 understands.
+#
+# Each data bit becomes 4 SPI bits at 3.2MHz: 0b0001 for a zero and
+# 0b0011 for a one. Each two data bits thus make one byte on the wire,
+# and each 8-bit color value makes one 32-bit word in the buffer.
+#
+# In the compact encoding each data bit becomes 3 SPI bits instead,
+# 0b001 for a zero and 0b011 for a one, so each color value makes 3
+# bytes and each LED 9 rather than 12.
+
+# Encoded bytes corresponding to 2-bit values
+buf_bytes = (0x11, 0x13, 0x31, 0x33)
+
+def fill_transform_table(table, intensity=1, gamma=1):
+    # Fill a bytearray(256) with the value each byte value becomes:
+    # v/255 raised to gamma (1 for none, ~2.2 to look even to the eye),
+    # then scaled by intensity, in 8.8 fixed point
+    br = max(round(intensity * 256), 0)
+    for v in range(256):
+        g = v if gamma == 1 else round(255 * (v / 255) ** gamma)
+        table[v] = min((br*g + 128) >> 8, 255)
+    return table
+
+def fill_encode_table(table, intensity=1, spi_bits=4, gamma=1):
+    # Fill a bytearray(spi_bits*256) with the encoded word for each
+    # byte value, spi_bits being the SPI bits per data bit (4 or 3).
+    # Entry v is at table[4*v:4*v+4] (or table[3*v:3*v+3]), most
+    # significant bits first, which is both the order they go out on
+    # the wire and the order of the word in memory.
+    # The values are transformed on the way (see fill_transform_table),
+    # so brightness and gamma are free at encode time
+    tt = fill_transform_table(bytearray(256), intensity, gamma)
+    for v in range(256):
+        s = tt[v]
+        if spi_bits == 3:
+            e = 0
+            for k in range(7, -1, -1):
+                e = e << 3 | (0b011 if s >> k & 1 else 0b001)
+            i = 3*v
+            table[i] = e >> 16
+            table[i+1] = e >> 8 & 0xff
+            table[i+2] = e & 0xff
+            continue
+        i = 4*v
+        table[i] = buf_bytes[s >> 6 & 0x03]
+        table[i+1] = buf_bytes[s >> 4 & 0x03]
+        table[i+2] = buf_bytes[s >> 2 & 0x03]
+        table[i+3] = buf_bytes[s & 0x03]
+    return table
+
+# Built once at import, shared by all WS2812 instances at intensity 1
+encode_table = fill_encode_table(bytearray(4*256))
+
+_shared_tables = {4: encode_table}
+
+def shared_encode_table(spi_bits=4):
+    # The full-intensity table for an encoding. The compact one is only
+    # built when first wanted.
+    table = _shared_tables.get(spi_bits)
+    if table is None:
+        table = fill_encode_table(bytearray(spi_bits*256), 1, spi_bits)
+        _shared_tables[spi_bits] = table
+    return table
+
+def intensity_table(intensity, spi_bits=4, table=None, gamma=1):
+    # The encode table to use at intensity and gamma: the shared one
+    # at 1 and 1, else a private one, which is table refilled in place
+    # if it is one
+    shared = shared_encode_table(spi_bits)
+    if intensity == 1 and gamma == 1:
+        return shared
+    if table is None or table is shared:
+        table = bytearray(len(shared))
+    return fill_encode_table(table, intensity, spi_bits, gamma)
+
+def decoded_value(buf, i):
+    # Decode the encoded word at buf[i:i+4] back to a value in 0-255
+    v = 0
+    for k in range(i, i+4):
+        b = buf[k]
+        v = v << 2 | (b >> 4 & 0x02) | (b >> 1 & 0x01)
+    return v
+
+def decoded_value3(buf, i):
+    # Decode the compact-encoded value at buf[i:i+3] back to 0-255
+    e = buf[i] << 16 | buf[i+1] << 8 | buf[i+2]
+    v = 0
+    for k in range(22, -1, -3):
+        v = v << 1 | (e >> k & 1)
+    return v
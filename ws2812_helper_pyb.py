@@ -1,20 +1,55 @@
 # -*- coding: utf-8 -*-
 from uctypes import addressof #, bytearray_at
+from ws2812_encode import encode_table, shared_encode_table
 
 def _get(a, i):
     rv = __get(a, i)
     #print("<%d is %r>" % (i, rv))        # DEBUG
     return rv
 
-def _set(a, i, v):
+def _set(a, i, v, table=encode_table):
     #print("<%d becoming %r>" % (i, v))        # DEBUG
-    return __set(a, i, v)
+    return __set(a, i, v, table)
+
+def _set_rgb_span(buf, index, data, qty, table=encode_table, data_index=0):
+    # Encode qty pixels of flat (r,g,b,r,g,b,...) data, from pixel
+    # data_index on, into buf starting at pixel index, in one call
+    __set_rgb_span(addressof(buf) + 4*3*index, addressof(data) + 3*data_index,
+                   qty, table)
+
+def _get_rgb_span(buf, index, dest, qty):
+    # Decode qty pixels of buf starting at pixel index into flat
+    # (r,g,b,r,g,b,...) bytes at dest, in one call
+    __get_rgb_span(addressof(dest), addressof(buf) + 4*3*index, qty)
 
 def _clearLEDs(buf, i, qty):
     # Clear qty LEDs in buffer starting at i
     a = addressof(buf)
     _fillwords(a + 4*3*i, 0x11111111, 3*qty)
 
+# The compact encoding, 3 bytes per color value (see ws2812_encode)
+
+def _get3(a, i):
+    return __get3(a, i)
+
+def _set3(a, i, v, table):
+    return __set3(a, i, v, table)
+
+def _set_rgb_span3(buf, index, data, qty, table, data_index=0):
+    # Encode qty pixels of flat (r,g,b,r,g,b,...) data, from pixel
+    # data_index on, into buf starting at pixel index, in one call
+    __set_rgb_span3(addressof(buf) + 3*3*index, addressof(data) + 3*data_index,
+                    qty, table)
+
+def _get_rgb_span3(buf, index, dest, qty):
+    # Decode qty pixels of buf starting at pixel index into flat
+    # (r,g,b,r,g,b,...) bytes at dest, in one call
+    __get_rgb_span3(addressof(dest), addressof(buf) + 3*3*index, qty)
+
+def _clearLEDs3(buf, i, qty):
+    # Clear qty LEDs in buffer starting at i
+    __fill3(addressof(buf) + 3*3*i, 3*qty, shared_encode_table(3))
+
 
 @micropython.asm_thumb
 def __get(r0, r1):
@@ -61,80 +96,64 @@ def __get(r0, r1):
 
 
 @micropython.asm_thumb
-def __set(r0, r1, r2):
+def __set(r0, r1, r2, r3):
     # Register arguments:
     # r0: base of encoded pixel buffer (12 bytes / pixel)
     # r1: pixel offset e.g. 7 for red value of 3rd pixel in chain
     # r2: value to set
+    # r3: base of encode table (one 32-bit word per byte value)
 
-    # r3: address of encoded pixel
-    # r4: 2
-    # r5: base of data table
-    # r6: 3
-    # r7: temporary
+    # r4: temporary
+    lsl(r1, r1, 2)     # * 4 = word width
+    add(r1, r1, r0)    # r1 is address of encoded 32-bit word
 
-    mov(r5, pc)        # know the base of the data table
-    b(START)           # get to entry point
-    data(1, 0x11, 0x13, 0x31, 0x33) # encoded bytes corresponding to 2-bit values
-    align(2)           # ritual requirement
+    mov(r4, 0xff)
+    and_(r2, r4)       # use only the low byte of value
+    lsl(r2, r2, 2)     # * 4 = word width
+    add(r2, r2, r3)    # r2 is address of encoded value in table
+    ldr(r0, [r2,0])    # r0 is encoded value
+    str(r0, [r1,0])    # store encoded value
 
-    label(ENCODE)      # The encode(r1) entry point
-    # r1 is value in 0-255 to encode
-    # returns encoded word in r0
-    mov(r7, r1)        # r7 is value
-    and_(r7, r6)       # r7 is bottom two bits of value
-    add(r7, r7, r5)    # r7 is address of encoded data byte
-    ldrb(r0, [r7,0])   # r0 is encoded data byte
 
-    lsr(r1, r4)        # r1 is value >> 2
-    mov(r7, r1)        # r7 is value >> 2
-    and_(r7, r6)       # r7 is b3b2 of value
-    add(r7, r7, r5)    # r7 is address of encoded data byte
-    ldrb(r7, [r7,0])   # r7 is encoded data byte
-    lsl(r0, r6)        # r0 <<= 3
-    lsl(r0, r6)        # r0 <<= 3
-    lsl(r0, r4)        # r0 <<= 2 (in sum, r0 <<= 8)
-    orr(r0, r7)        # r0 half done
-
-    lsr(r1, r4)        # r1 is value >> 4
-    mov(r7, r1)        # r7 is value >> 4
-    and_(r7, r6)       # r7 is b5b4 of value
-    add(r7, r7, r5)    # r7 is address of encoded data byte
-    ldrb(r7, [r7,0])   # r7 is encoded data byte
-    lsl(r0, r6)        # r0 <<= 3
-    lsl(r0, r6)        # r0 <<= 3
-    lsl(r0, r4)        # r0 <<= 2 (in sum, r0 <<= 8)
-    orr(r0, r7)        # r0 three-quarters done
+@micropython.asm_thumb
+def _set_rgb_values(r0, r1, r2, r3):
+    # Register arguments:
+    # r0: base of encoded pixel buffer (12 bytes / pixel)
+    # r1: pixel #
+    # r2: base of bytearray((r,g,b)) of values to set
+    # r3: base of encode table (one 32-bit word per byte value)
 
-    lsr(r1, r4)        # r1 is value >> 6
-    mov(r7, r1)        # r7 is value >> 6
-    and_(r7, r6)       # r7 is b7b6 of value
-    add(r7, r7, r5)    # r7 is address of encoded data byte
-    ldrb(r7, [r7,0])   # r7 is encoded data byte
-    lsl(r0, r6)        # r0 <<= 3
-    lsl(r0, r6)        # r0 <<= 3
-    lsl(r0, r4)        # r0 <<= 2 (in sum, r0 <<= 8)
-    orr(r0, r7)        # r0 all done
-    bx(lr)
+    # r4: address of first (i.e. green) encoded 32-bit word
+    # r1: temporary
 
-    label(START)       # entry point
+    # Find the starting address of where we store result
+    mov(r4, 12)         # 12 bytes per pixel
+    mul(r4, r1)         # r4 is address offset from base
+    add(r4, r4, r0)     # r4 is address of first (i.e. green) encoded 32-bit word
 
-    # Find the address of where we store result
-    add(r1, r1, r1)    # * 2
-    add(r1, r1, r1)    # * 4 = word width
-    add(r3, r0, r1)    # r3 is address of encoded 32-bit word
+    ldrb(r1, [r2,1])    # get green value
+    lsl(r1, r1, 2)      # * 4 = word width
+    add(r1, r1, r3)     # r1 is address of encoded green in table
+    ldr(r0, [r1,0])
+    str(r0, [r4,0])     # store encoded green
 
-    # set up useful constants
-    mov(r4, 2)
-    mov(r6, 3)
+    ldrb(r1, [r2,0])    # get red value
+    lsl(r1, r1, 2)
+    add(r1, r1, r3)
+    ldr(r0, [r1,0])
+    str(r0, [r4,4])     # store encoded red
 
-    mov(r1, r2)        # pass pixel value to encoder
-    bl(ENCODE)
-    str(r0, [r3,0])    # store encoded value
+    ldrb(r1, [r2,2])    # get blue value
+    lsl(r1, r1, 2)
+    add(r1, r1, r3)
+    ldr(r0, [r1,0])
+    str(r0, [r4,8])     # store encoded blue
 
 
 @micropython.asm_thumb
-def _set_rgb_values(r0, r1, r2):
+def _set_rgb_values_shift(r0, r1, r2):
+    # The encoder as it was before the encode table, shifting 2 bits
+    # at a time through a 4-byte table. Kept for benchmarking.
     # Register arguments:
     # r0: base of encoded pixel buffer (12 bytes / pixel)
     # r1: pixel #
@@ -214,6 +233,110 @@ def _set_rgb_values(r0, r1, r2):
     str(r0, [r3,8])     # store encoded blue
 
 
+@micropython.asm_thumb
+def __set_rgb_span(r0, r1, r2, r3):
+    # Register arguments:
+    # r0: address of first (i.e. green) encoded 32-bit word to store
+    # r1: address of flat bytes (r,g,b,r,g,b,...) of values to set
+    # r2: number of pixels
+    # r3: base of encode table (one 32-bit word per byte value)
+
+    # r4: temporary
+    label(LOOP)
+    cmp(r2, 0)          # if no pixels remain:
+    ble(DONE)           #  return
+
+    ldrb(r4, [r1,1])    # get green value
+    lsl(r4, r4, 2)      # * 4 = word width
+    add(r4, r4, r3)     # r4 is address of encoded green in table
+    ldr(r4, [r4,0])
+    str(r4, [r0,0])     # store encoded green
+
+    ldrb(r4, [r1,0])    # get red value
+    lsl(r4, r4, 2)
+    add(r4, r4, r3)
+    ldr(r4, [r4,0])
+    str(r4, [r0,4])     # store encoded red
+
+    ldrb(r4, [r1,2])    # get blue value
+    lsl(r4, r4, 2)
+    add(r4, r4, r3)
+    ldr(r4, [r4,0])
+    str(r4, [r0,8])     # store encoded blue
+
+    add(r1, 3)          # next source pixel
+    add(r0, 12)         # next encoded pixel
+    sub(r2, 1)
+    b(LOOP)
+    label(DONE)
+
+
+@micropython.asm_thumb
+def __get_rgb_span(r0, r1, r2):
+    # Register arguments:
+    # r0: address of flat bytes (r,g,b,r,g,b,...) to store decoded values
+    # r1: address of first (i.e. green) encoded 32-bit word to decode
+    # r2: number of pixels
+
+    # r3, r4: temporaries
+    # r5: address of encoded word to decode
+    # r6: decoded value
+    # r7: unused
+    b(START)
+
+    label(DECODE)       # The decode(r5) entry point, returns value in r6
+    # See __get for how the bits are herded
+    ldr(r3, [r5, 0])
+    mov(r6, r3)
+    mov(r4, 1)
+    lsr(r6, r4)
+    and_(r6, r3)
+    mov(r3, r6)
+    mov(r4, 3)
+    lsl(r6, r4)
+    orr(r6, r3)
+    mov(r3, r6)
+    mov(r4, 10)
+    lsl(r6, r4)
+    orr(r6, r3)
+    mov(r4, 7)
+    lsr(r6, r4)
+    movwt(r4, 0xf000f0)
+    and_(r6, r4)
+    mov(r3, r6)
+    mov(r4, 20)
+    lsr(r6, r4)
+    orr(r6, r3)
+    mov(r4, 0xff)
+    and_(r6, r4)
+    bx(lr)
+
+    label(START)        # entry point
+    label(LOOP)
+    cmp(r2, 0)          # if no pixels remain:
+    ble(DONE)           #  return
+
+    mov(r5, r1)
+    add(r5, 4)          # encoded red
+    bl(DECODE)
+    strb(r6, [r0, 0])   # store red
+
+    mov(r5, r1)         # encoded green
+    bl(DECODE)
+    strb(r6, [r0, 1])   # store green
+
+    mov(r5, r1)
+    add(r5, 8)          # encoded blue
+    bl(DECODE)
+    strb(r6, [r0, 2])   # store blue
+
+    add(r0, 3)          # next decoded pixel
+    add(r1, 12)         # next encoded pixel
+    sub(r2, 1)
+    b(LOOP)
+    label(DONE)
+
+
 @micropython.asm_thumb
 def _fillwords(r0, r1, r2):
     # _fillwords(address, word, n), returns first word address past fill
@@ -234,6 +357,42 @@ def _fillwords(r0, r1, r2):
     label(done)
 
 
+@micropython.asm_thumb
+def _reverseblocks(r0, r1, r2):
+    # _reverseblocks(address, n, w) reverses the order of n blocks of w
+    # words each, the words within each block keeping their order
+    # Registers:
+    # r0: address of the low block
+    # r1: number of blocks, then address of the high block
+    # r2: words per block
+    # r3: bytes per block
+    # r4, r5: the words being swapped
+    # r6: words of the block left to swap
+    add(r3, r2, r2)     # 2 * w
+    add(r3, r3, r3)     # 4 * w
+    sub(r1, 1)          # n - 1
+    mul(r1, r3)
+    add(r1, r1, r0)     # r1 is address of block n - 1
+
+    label(loop)
+    cmp(r0, r1)         # if the blocks have met:
+    bcs(done)           #  return
+    mov(r6, r2)
+    label(swap)
+    ldr(r4, [r0, 0])
+    ldr(r5, [r1, 0])
+    str(r5, [r0, 0])
+    str(r4, [r1, 0])
+    add(r0, 4)
+    add(r1, 4)
+    sub(r6, 1)
+    bgt(swap)
+    sub(r1, r1, r3)     # r0 is now at the next block up, and
+    sub(r1, r1, r3)     # r1 at the next block down
+    b(loop)
+    label(done)
+
+
 @micropython.asm_thumb
 def _movewords(r0, r1, r2):
     # styled after memmove(dest, src, n), but moving words instead of bytes
@@ -272,3 +431,250 @@ def _movewords(r0, r1, r2):
     bgt(loop)
 
     label(done)
+
+
+@micropython.asm_thumb
+def __get3(r0, r1):
+    # Registers:
+    # r0: base of array of 3-byte encoded color values
+    # r1: index into array
+    # r2: encoded value, shifted down as its bits are decoded
+    # r3: weight of the bit being decoded
+    # r4: temporary
+    add(r2, r1, r1)     # * 2
+    add(r1, r2, r1)     # * 3
+    add(r1, r1, r0)     # r1 is address of encoded value
+
+    ldrb(r2, [r1, 0])   # r2 is the 24 encoded bits, 3 for each data
+    lsl(r2, r2, 16)     # bit, of which the middle one is the data bit
+    ldrb(r4, [r1, 1])
+    lsl(r4, r4, 8)
+    orr(r2, r4)
+    ldrb(r4, [r1, 2])
+    orr(r2, r4)
+    lsr(r2, r2, 1)      # r2 has data bit 0 at bit 0, bit 1 at 3, ...
+
+    mov(r0, 0)
+    mov(r3, 1)
+    label(BIT)
+    mov(r4, 1)
+    and_(r4, r2)        # if this data bit is set:
+    beq(ZERO)
+    orr(r0, r3)         #  set it in the result
+    label(ZERO)
+    lsr(r2, r2, 3)      # next data bit
+    add(r3, r3, r3)     # and its weight
+    cmp(r3, 0xff)
+    bls(BIT)
+
+
+@micropython.asm_thumb
+def __set3(r0, r1, r2, r3):
+    # Register arguments:
+    # r0: base of encoded pixel buffer (9 bytes / pixel)
+    # r1: color value offset e.g. 7 for red value of 3rd pixel in chain
+    # r2: value to set
+    # r3: base of encode table (3 bytes per byte value)
+
+    # r4: temporary
+    add(r4, r1, r1)
+    add(r1, r4, r1)     # * 3 = encoded value width
+    add(r1, r1, r0)     # r1 is address of encoded value
+
+    mov(r4, 0xff)
+    and_(r2, r4)        # use only the low byte of value
+    add(r4, r2, r2)
+    add(r2, r4, r2)     # * 3 = encoded value width
+    add(r2, r2, r3)     # r2 is address of encoded value in table
+    ldrb(r0, [r2, 0])
+    strb(r0, [r1, 0])
+    ldrb(r0, [r2, 1])
+    strb(r0, [r1, 1])
+    ldrb(r0, [r2, 2])
+    strb(r0, [r1, 2])
+
+
+@micropython.asm_thumb
+def _set_rgb_values3(r0, r1, r2, r3):
+    # Register arguments:
+    # r0: base of encoded pixel buffer (9 bytes / pixel)
+    # r1: pixel #
+    # r2: base of bytearray((r,g,b)) of values to set
+    # r3: base of encode table (3 bytes per byte value)
+
+    # r4: address of encoded value in table
+    # r1: temporary
+    mov(r4, 9)          # 9 bytes per pixel
+    mul(r4, r1)
+    add(r0, r0, r4)     # r0 is address of encoded green
+
+    ldrb(r1, [r2, 1])   # get green value
+    add(r4, r1, r1)
+    add(r4, r4, r1)     # * 3 = encoded value width
+    add(r4, r4, r3)     # r4 is address of encoded green in table
+    ldrb(r1, [r4, 0])
+    strb(r1, [r0, 0])
+    ldrb(r1, [r4, 1])
+    strb(r1, [r0, 1])
+    ldrb(r1, [r4, 2])
+    strb(r1, [r0, 2])   # stored encoded green
+
+    ldrb(r1, [r2, 0])   # get red value
+    add(r4, r1, r1)
+    add(r4, r4, r1)
+    add(r4, r4, r3)
+    ldrb(r1, [r4, 0])
+    strb(r1, [r0, 3])
+    ldrb(r1, [r4, 1])
+    strb(r1, [r0, 4])
+    ldrb(r1, [r4, 2])
+    strb(r1, [r0, 5])   # stored encoded red
+
+    ldrb(r1, [r2, 2])   # get blue value
+    add(r4, r1, r1)
+    add(r4, r4, r1)
+    add(r4, r4, r3)
+    ldrb(r1, [r4, 0])
+    strb(r1, [r0, 6])
+    ldrb(r1, [r4, 1])
+    strb(r1, [r0, 7])
+    ldrb(r1, [r4, 2])
+    strb(r1, [r0, 8])   # stored encoded blue
+
+
+@micropython.asm_thumb
+def __set_rgb_span3(r0, r1, r2, r3):
+    # Register arguments:
+    # r0: address of first (i.e. green) encoded value to store
+    # r1: address of flat bytes (r,g,b,r,g,b,...) of values to set
+    # r2: number of pixels
+    # r3: base of encode table (3 bytes per byte value)
+
+    # r4: address of encoded value in table
+    # r5: temporary
+    label(LOOP)
+    cmp(r2, 0)          # if no pixels remain:
+    ble(DONE)           #  return
+
+    ldrb(r5, [r1, 1])   # get green value
+    add(r4, r5, r5)
+    add(r4, r4, r5)     # * 3 = encoded value width
+    add(r4, r4, r3)     # r4 is address of encoded green in table
+    ldrb(r5, [r4, 0])
+    strb(r5, [r0, 0])
+    ldrb(r5, [r4, 1])
+    strb(r5, [r0, 1])
+    ldrb(r5, [r4, 2])
+    strb(r5, [r0, 2])   # stored encoded green
+
+    ldrb(r5, [r1, 0])   # get red value
+    add(r4, r5, r5)
+    add(r4, r4, r5)
+    add(r4, r4, r3)
+    ldrb(r5, [r4, 0])
+    strb(r5, [r0, 3])
+    ldrb(r5, [r4, 1])
+    strb(r5, [r0, 4])
+    ldrb(r5, [r4, 2])
+    strb(r5, [r0, 5])   # stored encoded red
+
+    ldrb(r5, [r1, 2])   # get blue value
+    add(r4, r5, r5)
+    add(r4, r4, r5)
+    add(r4, r4, r3)
+    ldrb(r5, [r4, 0])
+    strb(r5, [r0, 6])
+    ldrb(r5, [r4, 1])
+    strb(r5, [r0, 7])
+    ldrb(r5, [r4, 2])
+    strb(r5, [r0, 8])   # stored encoded blue
+
+    add(r1, 3)          # next source pixel
+    add(r0, 9)          # next encoded pixel
+    sub(r2, 1)
+    b(LOOP)
+    label(DONE)
+
+
+@micropython.asm_thumb
+def __get_rgb_span3(r0, r1, r2):
+    # Register arguments:
+    # r0: address of flat bytes (r,g,b,r,g,b,...) to store decoded values
+    # r1: address of first (i.e. green) encoded value to decode
+    # r2: number of pixels
+
+    # r3, r4, r7: temporaries
+    # r5: address of encoded value to decode
+    # r6: decoded value
+    b(START)
+
+    label(DECODE)       # The decode(r5) entry point, returns value in r6
+    # See __get3 for how the bits are picked out
+    ldrb(r7, [r5, 0])
+    lsl(r7, r7, 16)
+    ldrb(r4, [r5, 1])
+    lsl(r4, r4, 8)
+    orr(r7, r4)
+    ldrb(r4, [r5, 2])
+    orr(r7, r4)
+    lsr(r7, r7, 1)
+    mov(r6, 0)
+    mov(r3, 1)
+    label(BIT)
+    mov(r4, 1)
+    and_(r4, r7)
+    beq(ZERO)
+    orr(r6, r3)
+    label(ZERO)
+    lsr(r7, r7, 3)
+    add(r3, r3, r3)
+    cmp(r3, 0xff)
+    bls(BIT)
+    bx(lr)
+
+    label(START)        # entry point
+    label(LOOP)
+    cmp(r2, 0)          # if no pixels remain:
+    ble(DONE)           #  return
+
+    mov(r5, r1)
+    add(r5, 3)          # encoded red
+    bl(DECODE)
+    strb(r6, [r0, 0])   # store red
+
+    mov(r5, r1)         # encoded green
+    bl(DECODE)
+    strb(r6, [r0, 1])   # store green
+
+    mov(r5, r1)
+    add(r5, 6)          # encoded blue
+    bl(DECODE)
+    strb(r6, [r0, 2])   # store blue
+
+    add(r0, 3)          # next decoded pixel
+    add(r1, 9)          # next encoded pixel
+    sub(r2, 1)
+    b(LOOP)
+    label(DONE)
+
+
+@micropython.asm_thumb
+def __fill3(r0, r1, r2):
+    # Registers:
+    # r0: address of first encoded value to fill
+    # r1: number of encoded values to fill
+    # r2: address of the 3-byte encoded value to fill with
+    # r3, r4, r5: the encoded value
+    ldrb(r3, [r2, 0])
+    ldrb(r4, [r2, 1])
+    ldrb(r5, [r2, 2])
+    label(loop)
+    cmp(r1, 0)
+    ble(done)
+    strb(r3, [r0, 0])
+    strb(r4, [r0, 1])
+    strb(r5, [r0, 2])
+    add(r0, 3)
+    sub(r1, 1)
+    b(loop)
+    label(done)
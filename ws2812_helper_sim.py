@@ -1,29 +1,148 @@
 # -*- coding: utf-8 -*-
 from uctypes import addressof, bytearray_at
+from ws2812_encode import encode_table, decoded_value, buf_bytes, \
+    shared_encode_table, decoded_value3
 
 def _get(a, i):
 #    b = bytearray_at(a, 64*3*4)
-    rv = a[i]
+    rv = decoded_value(a, 4*i)
     #print("<%d is %r>" % (i, rv))        # DEBUG
     return rv
 
-def _set(a, i, v):
+def _set(a, i, v, table=encode_table):
 #    b = bytearray_at(a, 64*3*4)
     b = a
     #print("<%d becoming %r>" % (i, v))        # DEBUG
-    b[i] = v
+    i *= 4
+    k = 4 * (v & 0xff)
+    b[i] = table[k]
+    b[i+1] = table[k+1]
+    b[i+2] = table[k+2]
+    b[i+3] = table[k+3]
 
-def _set_rgb_values(buf, index, value):
+def _set_rgb_values(buf, index, value, table=encode_table):
     #print("_set_rgb_values(0x%x, %d, %r)" % (addressof(buf), index, value))
     if isinstance(value, int):
         value = bytearray_at(value, 3)
     i = index * 3
     # G, R, B
-    buf[i] = value[1]
-    buf[i+1] = value[0]
-    buf[i+2] = value[2]
+    _set(buf, i, value[1], table)
+    _set(buf, i+1, value[0], table)
+    _set(buf, i+2, value[2], table)
+
+def _set_rgb_values_shift(buf, index, value):
+    # The encoder as it was before the encode table, shifting 2 bits
+    # at a time. Kept for benchmarking.
+    if isinstance(value, int):
+        value = bytearray_at(value, 3)
+    i = index * 12
+    for c in (value[1], value[0], value[2]):
+        buf[i] = buf_bytes[c >> 6 & 0x03]
+        buf[i+1] = buf_bytes[c >> 4 & 0x03]
+        buf[i+2] = buf_bytes[c >> 2 & 0x03]
+        buf[i+3] = buf_bytes[c & 0x03]
+        i += 4
+
+def _set_rgb_span(buf, index, data, qty, table=encode_table, data_index=0):
+    # Set qty pixels from flat (r,g,b,r,g,b,...) data, from pixel
+    # data_index on, starting at index
+    i = index * 3
+    for k in range(3*data_index, 3*(data_index + qty), 3):
+        # G, R, B
+        _set(buf, i, data[k+1], table)
+        _set(buf, i+1, data[k], table)
+        _set(buf, i+2, data[k+2], table)
+        i += 3
+
+def _get_rgb_span(buf, index, dest, qty):
+    # Decode qty pixels starting at index into flat (r,g,b,r,g,b,...) dest
+    i = index * 12
+    for k in range(0, 3*qty, 3):
+        # Encoded as G, R, B
+        dest[k] = decoded_value(buf, i+4)
+        dest[k+1] = decoded_value(buf, i)
+        dest[k+2] = decoded_value(buf, i+8)
+        i += 12
 
 def _clearLEDs(buf, start, qty):
     # Clear qty LEDs in buffer starting at i
-    for i in range(start, start + qty):
-        buf[i] = 0
+    for i in range(3*start, 3*(start + qty)):
+        _set(buf, i, 0)
+
+def _fillwords(a, w, n):
+    # _fillwords(address, word, n), storing the word little-endian as
+    # the pyboard does
+    if n <= 0:
+        return
+    b = bytearray_at(a, 4*n)
+    word = bytes((w & 0xff, w >> 8 & 0xff, w >> 16 & 0xff, w >> 24 & 0xff))
+    for i in range(0, 4*n, 4):
+        b[i:i+4] = word
+
+def _movewords(dest, src, n):
+    # styled after memmove(dest, src, n), but moving words instead of bytes
+    if n <= 0 or dest == src:
+        return
+    bytearray_at(dest, 4*n)[:] = bytes(bytearray_at(src, 4*n))
+
+
+# The compact encoding, 3 bytes per color value (see ws2812_encode)
+
+def _get3(a, i):
+    return decoded_value3(a, 3*i)
+
+def _set3(a, i, v, table):
+    i *= 3
+    k = 3 * (v & 0xff)
+    a[i] = table[k]
+    a[i+1] = table[k+1]
+    a[i+2] = table[k+2]
+
+def _set_rgb_values3(buf, index, value, table):
+    if isinstance(value, int):
+        value = bytearray_at(value, 3)
+    i = index * 3
+    # G, R, B
+    _set3(buf, i, value[1], table)
+    _set3(buf, i+1, value[0], table)
+    _set3(buf, i+2, value[2], table)
+
+def _set_rgb_span3(buf, index, data, qty, table, data_index=0):
+    # Set qty pixels from flat (r,g,b,r,g,b,...) data, from pixel
+    # data_index on, starting at index
+    i = index * 3
+    for k in range(3*data_index, 3*(data_index + qty), 3):
+        # G, R, B
+        _set3(buf, i, data[k+1], table)
+        _set3(buf, i+1, data[k], table)
+        _set3(buf, i+2, data[k+2], table)
+        i += 3
+
+def _get_rgb_span3(buf, index, dest, qty):
+    # Decode qty pixels starting at index into flat (r,g,b,r,g,b,...) dest
+    i = index * 9
+    for k in range(0, 3*qty, 3):
+        # Encoded as G, R, B
+        dest[k] = decoded_value3(buf, i+3)
+        dest[k+1] = decoded_value3(buf, i)
+        dest[k+2] = decoded_value3(buf, i+6)
+        i += 9
+
+def _clearLEDs3(buf, start, qty):
+    # Clear qty LEDs in buffer starting at i
+    table = shared_encode_table(3)
+    for i in range(3*start, 3*(start + qty)):
+        _set3(buf, i, 0, table)
+
+def _reverseblocks(a, n, w):
+    # _reverseblocks(address, n, w) reverses the order of n blocks of w
+    # words each, the words within each block keeping their order
+    if n <= 1:
+        return
+    m = 4*w
+    b = bytearray_at(a, m*n)
+    for i in range(n // 2):
+        j = n - 1 - i
+        t = bytes(b[m*i:m*(i+1)])
+        b[m*i:m*(i+1)] = b[m*j:m*(j+1)]
+        b[m*j:m*(j+1)] = t
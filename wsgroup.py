@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+import pyb
+from ws2812 import _is_flat
+
+
+def _take(it, n):
+    # Up to the next n items of iterator it
+    if n <= 0:
+        return
+    for d in it:
+        yield d
+        n -= 1
+        if not n:
+            break
+
+
+class StripStats:
+    # Frame timing of one strip of a WSGroup, in microseconds from the
+    # start of a send to the strip being seen not busy
+    def __init__(self):
+        self.frames = 0
+        self.last_us = 0
+        self.max_us = 0
+        self.total_us = 0
+
+    def add(self, us):
+        self.frames += 1
+        self.last_us = us
+        self.total_us += us
+        if us > self.max_us:
+            self.max_us = us
+
+    def mean_us(self):
+        return self.total_us // self.frames if self.frames else 0
+
+    def __repr__(self):
+        return "<StripStats %d frames, last %d us, mean %d us, max %d us>" % \
+            (self.frames, self.last_us, self.mean_us(), self.max_us)
+
+
+class WSGroup:
+    # Several WS2812 strips, each on its own SPI bus, as one chain. The
+    # LEDs are indexed in the order of the strips. sync() sends each
+    # strip that has changed, as far as it has changed, as its own
+    # sync() would.
+    #
+    # Example:
+    #    group = WSGroup([WS2812(spi_bus=1, led_count=64),
+    #                     WS2812(spi_bus=2, led_count=59)])
+    #    group[70] = (0, 0, 255)  # LED 6 of the second strip
+    #    group.sync()
+    #
+    # Every changed strip is started before any is waited for, so they
+    # are all on the wire at once. That overlap needs an SPI that can
+    # send without waiting (as the pyb mock can). pyb.SPI.send blocks,
+    # so on a pyboard the strips go out one after another, with no time
+    # saved over syncing each in turn.
+
+    def __init__(self, strips):
+        self.strips = strips
+        # The index in the group of the first LED of each strip, and
+        # of the end
+        self.starts = starts = [0]
+        for strip in strips:
+            starts.append(starts[-1] + len(strip))
+        self.stats = [StripStats() for strip in strips]
+        self._sent_at = [None] * len(strips)
+        self.frame_us = 0
+
+    def __len__(self):
+        return self.starts[-1]
+
+    @property
+    def writes(self):
+        # Counts writes to any of the strips (see WS2812.writes)
+        writes = 0
+        for strip in self.strips:
+            writes += strip.writes
+        return writes
+
+    def locate(self, index):
+        # The strip number and index within it of LED index
+        length = len(self)
+        if not -length <= index < length:
+            raise IndexError("tried to get LED", index, "out of", length)
+        if index < 0:
+            index += length
+        starts = self.starts
+        k = 0
+        while starts[k+1] <= index:
+            k += 1
+        return k, index - starts[k]
+
+    def __getitem__(self, index):
+        if isinstance(index, int):
+            k, i = self.locate(index)
+            return self.strips[k][i]
+        return [self[i] for i in range(len(self))[index]]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, int):
+            k, i = self.locate(index)
+            self.strips[k][i] = value
+            return
+        for i, v in zip(range(len(self))[index], value):
+            self[i] = v
+
+    def __iter__(self):
+        for strip in self.strips:
+            for pix in strip:
+                yield pix
+
+    def fill_buf(self, data):
+        # Fill the strips in turn with RGB data, as WS2812.fill_buf
+        # does. All LEDs after the data are turned off.
+        if _is_flat(data):
+            mv = memoryview(data)
+            n = len(data) // 3
+            for strip, start in zip(self.strips, self.starts):
+                stop = start + len(strip)
+                if stop <= n:
+                    # All of the strip's data is there: no copy
+                    strip.update_buf_rgb(mv[3*start:3*stop])
+                else:
+                    strip.fill_buf(data[3*start:3*stop])
+            return
+        it = iter(data)
+        for strip in self.strips:
+            strip.fill_buf(_take(it, len(strip)))
+
+    def show(self, data):
+        self.fill_buf(data)
+        self.send_buf()
+
+    def start(self, all=False):
+        # Start sending each strip that has changed (or all of them), as
+        # far as it has changed, without waiting for any to finish
+        sent_at = self._sent_at
+        for k, strip in enumerate(self.strips):
+            strip.wait()
+            if strip.rgb is not None:
+                strip.encode_stale()
+            if all:
+                sent_at[k] = pyb.micros()
+                strip.send_buf_nowait()
+            elif strip.dirty_to:
+                sent_at[k] = pyb.micros()
+                strip.sync_nowait()
+
+    def busy(self):
+        return any(strip.busy() for strip in self.strips)
+
+    def wait(self):
+        # Wait for all the strips to be sent, noting how long each took
+        sent_at = self._sent_at
+        stats = self.stats
+        strips = self.strips
+        started = [t for t in sent_at if t is not None]
+        pending = len(started)
+        while pending:
+            for k in range(len(strips)):
+                t = sent_at[k]
+                if t is not None and not strips[k].busy():
+                    stats[k].add(pyb.elapsed_micros(t))
+                    sent_at[k] = None
+                    pending -= 1
+        if started:
+            self.frame_us = pyb.elapsed_micros(min(started))
+
+    def sync(self):
+        # Send the strips that have changed, all at once
+        self.start()
+        self.wait()
+
+    def send_buf(self):
+        # Send all the strips, all at once
+        self.start(all=True)
+        self.wait()
@@ -1,15 +1,29 @@
 import uctypes
-from ws2812 import SubscriptableForPixel
+from ws2812 import SubscriptableForPixel, CACHE, CURSOR
 
 from led_utils import gaussian_blur_weights
-from led_utils import _movewords
+from led_utils import _movewords, _reverseblocks
+
+# Where cw() and ccw() stash the LED they move around
+_stash = bytearray(12)
 
 class WSlice(SubscriptableForPixel):
     # This class encapsulates a WS2812 and provides new capabilities
     # It intrudes into and depends on the internals of the pramasoul
     # version of WS2812
     def __init__(self, ws, start=0, end=None):
+        if ws.rgb is not None:
+            raise ValueError("a WSlice needs a WS2812 without a shadow")
+        if ws.spi_bits != 4:
+            raise ValueError("a WSlice needs a WS2812 with spi_bits=4")
         self.ws = ws
+        self.rgb = None
+        self._phase = 0
+        self.spi_bits = ws.spi_bits
+        self.pixel_class = ws.pixel_class
+        self._set_rgb_values = ws._set_rgb_values
+        self._set_rgb_span = ws._set_rgb_span
+        self._get_rgb_span = ws._get_rgb_span
         if  start < -len(ws) or start >= len(ws):
             raise IndexError("start %d is outside underlying ws of length %d" % (start, len(ws)))
         start %= len(ws)
@@ -18,17 +32,88 @@ class WSlice(SubscriptableForPixel):
             self.end = len(ws)
         else:
             self.end = end
-        self.pixels = ws[start:end]
+        self.led_count = n = len(range(len(ws))[start:end])
         self.sync = ws.sync     # risky
         self.mem = ws.mem
         self.a = uctypes.addressof(ws.buf) + 3*4*start
-        self.buf = uctypes.bytearray_at(self.a, 3*4*(end - start))
+        self.buf = uctypes.bytearray_at(self.a, 3*4*n)
+        if ws.mem <= CACHE:
+            self.pixels = ws[start:end]
+        elif ws.mem == CURSOR:
+            # The one Pixel, as WS2812 has, rather than a list of them
+            self.cursor = self.pixel_class(self, 0)
 
     def __len__(self):
-        return len(self.pixels)
+        return self.led_count
+
+    @property
+    def table(self):
+        return self.ws.table
+
+    @property
+    def intensity(self):
+        return self.ws.intensity
+
+    @intensity.setter
+    def intensity(self, v):
+        self.ws.intensity = v
+
+    @property
+    def gamma(self):
+        return self.ws.gamma
+
+    @gamma.setter
+    def gamma(self, v):
+        self.ws.gamma = v
+
+    @property
+    def writes(self):
+        return self.ws.writes
+
+    def touch(self, stop=None):
+        # Note that LEDs before stop (default all) of this slice have
+        # changed, for sync() to send
+        if stop is None or stop > len(self):
+            stop = len(self)
+        self.ws.touch(self.start + stop)
+
+    @property
+    def phase(self):
+        # How many pixels clockwise the slice is turned when sent. The
+        # buffer is not changed: indexing still gets and sets the
+        # pattern as it was drawn, and only where it shows moves.
+        return self._phase
+
+    @phase.setter
+    def phase(self, p):
+        p %= len(self)
+        if p == self._phase:
+            return
+        ws = self.ws
+        spun = ws.spun
+        if p:
+            end = self.start + len(self)
+            for sl in spun:
+                if sl is not self and sl.start < end \
+                   and self.start < sl.start + len(sl):
+                    raise ValueError("overlaps a WSlice with a phase")
+        if self in spun:
+            spun.remove(self)
+        if p:
+            i = 0
+            while i < len(spun) and spun[i].start < self.start:
+                i += 1
+            spun.insert(i, self)
+        self._phase = p
+        self.touch()
+
+    def spin(self, k=1):
+        # Turn the whole slice k pixels clockwise, as k cw()'s would
+        # look, but only at send time, whatever the length
+        self.phase = self._phase + k
 
     def update_buf(self, data, where=0):
-        self.ws.update_buf(data, where=where+self.start)
+        return self.ws.update_buf(data, where=where+self.start) - self.start
 
     # Too fancy, creates memory stress:
     """
@@ -67,11 +152,11 @@ class WSlice(SubscriptableForPixel):
         if stop <= start + 1:   # Trivial rotation
             return
         a = uctypes.addressof(self.buf)
-        tbuf = bytearray(12)
-        b = uctypes.addressof(tbuf)
+        b = uctypes.addressof(_stash)
         _movewords(b, a+12*start, 3) # stash 3 words that will get overwritten
         _movewords(a+12*start, a+12*(start+1), 3*(stop-start-1)) # move all but the last word down
         _movewords(a+12*(stop-1), b, 3) # unstash
+        self.touch(stop)
 
     def ccw(self, start=0, stop=None):
         # Rotates [start, stop) one pixel counter-clockwise
@@ -82,11 +167,30 @@ class WSlice(SubscriptableForPixel):
         if stop <= start + 1:   # Trivial rotation
             return
         a = uctypes.addressof(self.buf)
-        tbuf = bytearray(12)
-        b = uctypes.addressof(tbuf)
+        b = uctypes.addressof(_stash)
         _movewords(b, a+12*(stop-1), 3) # stash 3 words that will get overwritten
         _movewords(a+12*(start+1), a+12*start, 3*(stop-start-1)) # move all but the last word down
         _movewords(a+12*(start), b, 3) # unstash
+        self.touch(stop)
+
+    def rotate(self, k, start=0, stop=None):
+        # Rotates [start, stop) k pixels clockwise, i.e. toward the
+        # lower index, or counter-clockwise if k is negative.
+        # Done in place by three reversals, whatever k is
+        length = len(self)
+        if stop is None or stop > length:
+            stop = length
+        n = stop - start
+        if n <= 1:
+            return
+        k %= n
+        if k == 0:
+            return
+        a = uctypes.addressof(self.buf) + 12*start
+        _reverseblocks(a, k, 3)
+        _reverseblocks(a+12*k, n-k, 3)
+        _reverseblocks(a, n, 3)
+        self.touch(stop)
 
     def shift(self, amount=1, start=0, stop=None):
         # Shifts leds[start:end] by amount to the right
@@ -104,5 +208,7 @@ class WSlice(SubscriptableForPixel):
             n = max(stop - start - amount, 0)
         a = uctypes.addressof(self.buf)
         _movewords(a+12*dest, a+12*src, 3*n)
+        if n > 0:
+            self.touch(dest + n)
 
 
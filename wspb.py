@@ -9,6 +9,7 @@ from pprint import pprint
 from PIL import Image, ImageDraw, ImageFilter
 
 from pyb import _little_endian_int
+from ws2812_encode import decoded_value
 
 class SPIRecording:
     #SPIWrite = namedtuple('SPIWrite', 'ts', 'values')
@@ -36,9 +37,9 @@ class WS2812Recording(SPIRecording):
     def __next__(self):
         ts, data = SPIRecording.__next__(self)
         n = len(data) // (3*4)
-        colors = [(data[3*i+1],
-                   data[3*i+0],
-                   data[3*i+2]) for i in range(n)]
+        colors = [(decoded_value(data, 12*i+4),
+                   decoded_value(data, 12*i+0),
+                   decoded_value(data, 12*i+8)) for i in range(n)]
         return ts, colors
 
 